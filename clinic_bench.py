@@ -0,0 +1,1322 @@
+"""
+Benchmarks and consistency checks for the argument clinic.
+
+    python -m clinic_bench bench --save baseline.json       # per-intent throughput and p50/p99 latency
+    python -m clinic_bench bench --baseline baseline.json   # the same, failing on regressions
+    python -m clinic_bench --help                           # the other benchmarks and checks
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from clinic_core import (INTENT_MATCHER, ClassificationCache, ClinicEngine, IntentMatch, Session, build_matcher,
+                         catalog_to_dict, classify, compile_pattern, disable_instrumentation, enable_instrumentation,
+                         load_catalog, parse_input, parse_many, parse_parallel)
+
+# Phrases that trigger every intent, mixed with filler words that trigger none
+INTENT_PHRASES = [
+    "yes it is", "no it isn't", "no it is not", "you are wrong", "you're silly", "youre stubborn",
+    "you are not listening", "no", "not really", "yes", "sure", "indeed", "certainly", "i think",
+    "in my view", "my opinion is", "i believe", "my experience with", "i don't believe", "i dont agree",
+    "not convinced", "disagreed", "i find it hard to accept", "never", "always", "too hot", "it will rain",
+    "i feel", "feeling", "annoying", "infuriating", "amazing", "happy", "sad", "angry", "confused",
+    "impossible", "absolutely", "everyone knows", "pointless", "silly", "makes no sense",
+    "don't you understand", "you don't understand", "right", "wrong", "agree, but", "agree, although",
+    "i agree", "i see", "agreed", "i prefer", "i like", "i dislike", "better than", "worse than",
+    "similar to", "but what if", "considering the complexities", "i haven't considered", "what about",
+    "in the future", "will lead to", "consequences will be", "what should i do", "any suggestions",
+    "what do you think",
+    # Spellings that stress word boundaries, apostrophes and case folding
+    "piano it is not", "metoo far", "thankyoure kind", "you''re odd", "i don''t believe", "\not convinced",
+    "İ THINK", "nonsense", "yesterday it will", "agree,  but", "don't you understand??",
+]
+FILLER_WORDS = [
+    "the", "cat", "argument", "clinic", "today", "weather", "python", "coffee", "maybe", "because",
+    "people", "think", "idea", "this", "that", "is", "it", "you", "will", "too", "what", "agree",
+    "knowing", "nothing", "nobody", "notion", "yesterday", "surely", "rightly", "sensible", "sadly",
+]
+ENDINGS = ["", "", ".", "!", "?", "?\n", "??", " ?"]
+
+
+def generate_corpus(size, seed=0):
+    """
+    Generates synthetic user messages that hit every intent as well as the default case.
+    Args:
+    - size (int): Number of messages to generate
+    - seed (int): Seed for the generator, so the same corpus can be rebuilt
+    Returns:
+    - list of str: The generated messages
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(0, 12))]
+        for _ in range(rng.choice((0, 0, 1, 1, 2, 3))):
+            words.insert(rng.randint(0, len(words)), rng.choice(INTENT_PHRASES))
+        message = " ".join(words)
+        if rng.random() < 0.2:
+            message = message.upper() if rng.random() < 0.5 else message.title()
+        corpus.append(message + rng.choice(ENDINGS))
+    return corpus
+
+
+def latency_stats(durations):
+    """
+    Summarizes the durations of individual calls.
+    Args:
+    - durations (list of int): Duration of every call, in nanoseconds
+    Returns:
+    - dict: Number of calls, calls per second, and the p50 and p99 latencies in microseconds
+    """
+    durations = sorted(durations)
+    return {
+        "count": len(durations),
+        "per_second": len(durations) / (sum(durations) / 1e9) if sum(durations) else float("inf"),
+        "p50_us": durations[len(durations) // 2] / 1000,
+        "p99_us": durations[min(len(durations) - 1, len(durations) * 99 // 100)] / 1000,
+    }
+
+
+def bench_intents(corpus, repeat=5, seed=0):
+    """
+    Times parse_input on every message, grouped by the intent it detects, and every handler on the messages
+    routed to it, with the messages matched beforehand. The corpus is timed repeat times and the run with the
+    lowest median is kept for every intent and handler, which filters out most noise from other processes.
+    Args:
+    - corpus (list of str): The messages to answer
+    - repeat (int): Number of timed runs over the corpus
+    - seed (int): Seed of the responses' random choices
+    Returns:
+    - dict: {"parse_input": {intent: stats}, "handlers": {handler name: stats}}, see latency_stats
+    """
+    rng = random.Random(seed)
+    clock = time.perf_counter_ns
+    matched = [INTENT_MATCHER.match(message) for message in corpus]
+    results = {"parse_input": {}, "handlers": {}}
+    for _ in range(repeat):
+        parse_times = {}
+        handler_times = {}
+        for message, result in zip(corpus, matched):
+            start = clock()
+            parse_input(message, rng=rng)
+            parse_times.setdefault(result.intent, []).append(clock() - start)
+        for result in matched:
+            handler, responses = result.handler, result.responses
+            start = clock()
+            handler(result, responses, rng)
+            handler_times.setdefault(handler.__name__, []).append(clock() - start)
+        for group, times in (("parse_input", parse_times), ("handlers", handler_times)):
+            for name, durations in times.items():
+                stats = latency_stats(durations)
+                best = results[group].get(name)
+                if best is None or stats["p50_us"] < best["p50_us"]:
+                    results[group][name] = stats
+    return {group: dict(sorted(entries.items())) for group, entries in results.items()}
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Compares benchmark results with a saved baseline; only the median latency is compared, as p99 is too noisy.
+    Args:
+    - results (dict): The results of bench_intents
+    - baseline (dict): Earlier results of bench_intents
+    - threshold (float): Allowed slowdown, e.g. 0.25 for 25%
+    Returns:
+    - list of str: A description of every regression
+    """
+    regressions = []
+    for group, entries in results.items():
+        for name, stats in entries.items():
+            before = baseline.get(group, {}).get(name)
+            if before and stats["p50_us"] > before["p50_us"] * (1 + threshold):
+                regressions.append(f"{group} {name}: p50 {before['p50_us']:.2f}us -> {stats['p50_us']:.2f}us")
+    return regressions
+
+
+def best_times(functions, repeat):
+    """
+    Runs functions in turn several times and returns the fastest run of each; interleaving the runs spreads
+    slow periods of the machine over all of them.
+    Args:
+    - functions (list of callable): The functions to time, called without arguments
+    - repeat (int): Number of runs per function
+    Returns:
+    - list of float: Seconds taken by the fastest run of every function
+    """
+    timings = [float("inf")] * len(functions)
+    for _ in range(repeat):
+        for index, function in enumerate(functions):
+            start = time.perf_counter()
+            function()
+            timings[index] = min(timings[index], time.perf_counter() - start)
+    return timings
+
+
+def bench_instrumentation(corpus, repeat=5, seed=0):
+    """
+    Compares the cost per message of answering directly through the matcher, through parse_input with the
+    instrumentation disabled, enabled, and enabled with a no-op hook on every event.
+    Args:
+    - corpus (list of str): The messages to answer
+    - repeat (int): Number of runs per variant, the fastest one is kept
+    - seed (int): Seed of the responses' random choices
+    Returns:
+    - list of tuple: (variant, nanoseconds per message) for every variant
+    """
+    rng = random.Random(seed)
+    match = INTENT_MATCHER.match
+
+    def direct():
+        for message in corpus:
+            match(message).respond(rng)
+
+    def disabled():
+        disable_instrumentation()
+        for message in corpus:
+            parse_input(message, rng=rng)
+
+    def enabled():
+        enable_instrumentation(instrumentation)
+        for message in corpus:
+            parse_input(message, rng=rng)
+
+    def enabled_with_hooks():
+        enable_instrumentation(hooked)
+        for message in corpus:
+            parse_input(message, rng=rng)
+
+    instrumentation = enable_instrumentation()
+    hooked = enable_instrumentation()
+    hooked.before_match.append(lambda user_input: None)
+    hooked.after_match.append(lambda result, seconds: None)
+    hooked.after_handler.append(lambda result, response, seconds: None)
+    variants = [("matcher, no parse_input", direct), ("parse_input, disabled", disabled),
+                ("parse_input, enabled", enabled), ("parse_input, enabled, 3 hooks", enabled_with_hooks)]
+    try:
+        timings = best_times([function for _, function in variants], repeat)
+    finally:
+        disable_instrumentation()
+    return [(variant, seconds / len(corpus) * 1e9) for (variant, _), seconds in zip(variants, timings)]
+
+
+def check_prefiltered(corpus, matcher=INTENT_MATCHER, prefilter=True):
+    """
+    Checks that a keyword-prefiltered classifier picks the same intent and match as the pattern-by-pattern chain.
+    Args:
+    - corpus (list of str): The messages to classify
+    - matcher (IntentMatcher): The matcher under test
+    - prefilter (bool or str): The strategy under test, see IntentMatcher.match_function
+    Returns:
+    - list of tuple: The (message, chain intent, prefiltered intent) triples that disagree
+    """
+    match = matcher.match_function(prefilter)
+    mismatches = []
+    for message in corpus:
+        expected = matcher.match(message)
+        actual = match(message)
+        same_match = (expected.match is None and actual.match is None) or (
+            expected.match is not None and actual.match is not None
+            and expected.match.span() == actual.match.span()
+            and expected.match.groups() == actual.match.groups())
+        if expected.intent != actual.intent or not same_match:
+            mismatches.append((message, expected.intent, actual.intent))
+    return mismatches
+
+
+# Phrases of the intents late in the chain that skewed workloads are dominated by
+SKEWED_PHRASES = {
+    "emotions": ["i feel", "feeling", "happy", "sad", "angry", "confused", "annoying", "amazing"],
+    "right_wrong": ["right", "wrong"],
+    "seeking_advice": ["what should i do", "any suggestions", "what do you think"],
+    "default": [""],
+}
+
+
+def generate_skewed_corpus(size, phrases, share=0.8, seed=0):
+    """
+    Generates messages of which a share contains one of the given phrases, in filler words, and the rest is
+    drawn like generate_corpus.
+    Args:
+    - size (int): Number of messages to generate
+    - phrases (list of str): The phrases dominating the workload
+    - share (float): Fraction of the messages containing one of the phrases
+    - seed (int): Seed for the generator
+    Returns:
+    - list of str: The generated messages
+    """
+    rng = random.Random(seed)
+    mixed = iter(generate_corpus(size, seed))
+    corpus = []
+    for _ in range(size):
+        if rng.random() < share:
+            words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(0, 8))]
+            words.insert(rng.randint(0, len(words)), rng.choice(phrases))
+            corpus.append(" ".join(word for word in words if word) + rng.choice(ENDINGS[:4]))
+        else:
+            corpus.append(next(mixed))
+    return corpus
+
+
+def bench_ordering(corpus, repeat=5):
+    """
+    Compares the cost per message of classifying with the fixed pattern chain, the keyword prefilter and the
+    adaptive keyword checks, after the adaptive order has settled on the workload.
+    Args:
+    - corpus (list of str): The messages to classify
+    - repeat (int): Number of runs per strategy, the fastest one is kept
+    Returns:
+    - list of tuple: (strategy, nanoseconds per message) for every strategy
+    """
+    matcher = build_matcher(catalog_to_dict())
+    for message in corpus:
+        matcher.match_adaptive(message)
+    strategies = [("fixed chain", matcher.match), ("prefiltered", matcher.match_prefiltered),
+                  ("adaptive", matcher.match_adaptive)]
+
+    def timed(match):
+        def run():
+            for message in corpus:
+                match(message)
+        return run
+
+    timings = best_times([timed(match) for _, match in strategies], repeat)
+    return [(name, seconds / len(corpus) * 1e9) for (name, _), seconds in zip(strategies, timings)]
+
+
+# Short messages that make up much of the real traffic, repeated verbatim
+REPEATED_MESSAGES = ["no", "yes it is", "why?", "exit", "yes", "no it isn't", "you are wrong", "really?", "sure",
+                     "i feel sad", "what do you think?", "never", "that's silly", "right", "i agree", "ok"]
+
+
+def bench_cache(corpus, maxsize, repeat=5, seed=0):
+    """
+    Compares the cost per message of answering through parse_input without and with a classification cache.
+    Args:
+    - corpus (list of str): The messages to answer
+    - maxsize (int): Size of the cache
+    - repeat (int): Number of runs per variant, the fastest one is kept
+    - seed (int): Seed of the responses' random choices
+    Returns:
+    - tuple: (nanoseconds per message uncached, nanoseconds per message cached, the cache's stats of one run)
+    """
+    rng = random.Random(seed)
+    caches = []
+
+    def uncached():
+        for message in corpus:
+            parse_input(message, rng=rng)
+
+    def cached():
+        cache = ClassificationCache(maxsize)
+        caches.append(cache)
+        for message in corpus:
+            parse_input(message, rng=rng, cache=cache)
+
+    timings = best_times([uncached, cached], repeat)
+    return timings[0] / len(corpus) * 1e9, timings[1] / len(corpus) * 1e9, caches[-1].stats()
+
+
+def bench_cli(path, jsonl, prefilter, cache_size=0):
+    """
+    Streams a file of messages through clinic_cli.stream, discarding the output.
+    Args:
+    - path (str): The file of messages, one per line
+    - jsonl (bool): Write JSON records instead of the responses
+    - prefilter (bool or str): The matching strategy, see IntentMatcher.match_function
+    - cache_size (int): Size of the classification cache, 0 for none
+    Returns:
+    - float: Lines per second
+    """
+    from clinic_cli import stream
+
+    cache = ClassificationCache(cache_size) if cache_size > 0 else None
+    with open(path, encoding="utf-8", errors="replace") as lines, open(os.devnull, "wb") as output:
+        start = time.perf_counter()
+        count = stream(lines, output, jsonl, prefilter, random.Random(0), cache=cache)
+    return count / (time.perf_counter() - start)
+
+
+def peak_memory(code):
+    """
+    Runs Python code in a child process, discarding its output.
+    Args:
+    - code (str): The code, run as with python -c
+    Returns:
+    - float: Peak resident memory of the child process, in MiB
+    """
+    # The kernel's high-water mark is reset by exec, unlike ru_maxrss, which a child inherits from its parent
+    code += "\nprint(next(line for line in open('/proc/self/status') if line.startswith('VmHWM')).split()[1])"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return int(output.split()[-1]) / 1024
+
+
+def write_transcripts(path, size, seed=0):
+    """
+    Writes a JSONL dump of generated messages, one record with a few other fields per line.
+    """
+    with open(path, "w", encoding="utf-8") as transcripts:
+        for chunk in range(0, size, 100_000):
+            corpus = generate_corpus(min(100_000, size - chunk), seed=seed + chunk)
+            transcripts.writelines(json.dumps({"session": f"s{(chunk + index) // 10}", "turn": (chunk + index) % 10,
+                                               "message": message, "meta": {"source": "bench"}}) + "\n"
+                                   for index, message in enumerate(corpus))
+
+
+def naive_ingest(path, field="message"):
+    """
+    The reference clinic_ingest.ingest is compared with: reads the whole file and decodes every line.
+    Args:
+    - path (str): The JSONL file
+    - field (str): Name of the field holding the message
+    Returns:
+    - Counter: The intents of the messages
+    """
+    with open(path, encoding="utf-8") as transcripts:
+        records = [json.loads(line) for line in transcripts.readlines()]
+    return Counter(parse_many([record[field] for record in records], intents_only=True, prefilter="adaptive"))
+
+
+def bench_extraction(path, field="message"):
+    """
+    Times extracting the messages of a JSONL file alone, memory-mapped with clinic_ingest.iter_messages and by
+    decoding every line with json.loads.
+    Args:
+    - path (str): The JSONL file
+    - field (str): Name of the field holding the message
+    Returns:
+    - tuple: (seconds memory-mapped, seconds with json.loads)
+    """
+    import mmap
+    from clinic_ingest import field_pattern, iter_messages
+
+    start = time.perf_counter()
+    with open(path, "rb") as transcripts, mmap.mmap(transcripts.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for _ in iter_messages(mapped, field_pattern(field)):
+            pass
+    mapped_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(path, encoding="utf-8") as transcripts:
+        for line in transcripts:
+            json.loads(line)[field]
+    return mapped_seconds, time.perf_counter() - start
+
+
+def bench_ingest(path):
+    """
+    Compares the time clinic_ingest.ingest and naive_ingest take on a JSONL file, and checks they agree.
+    Args:
+    - path (str): The JSONL file
+    Returns:
+    - tuple: (seconds of ingest, seconds of naive_ingest, whether their histograms are equal)
+    """
+    from clinic_ingest import ingest
+
+    start = time.perf_counter()
+    histogram, _ = ingest(path)
+    seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = naive_ingest(path)
+    return seconds, time.perf_counter() - start, histogram == expected
+
+
+def bench_classify(corpus, repeat=5, seed=0):
+    """
+    Compares the cost per message of classify and parse_input, for every matching strategy.
+    Args:
+    - corpus (list of str): The messages
+    - repeat (int): Number of runs per variant, the fastest one is kept
+    - seed (int): Seed of parse_input's random choices
+    Returns:
+    - list of tuple: (strategy, nanoseconds per message with parse_input, nanoseconds per message with classify)
+    """
+    rng = random.Random(seed)
+    results = []
+    for strategy, prefilter in (("chain", False), ("prefilter", True), ("adaptive", "adaptive")):
+        def parse():
+            for message in corpus:
+                parse_input(message, prefilter, rng)
+
+        def intents():
+            for message in corpus:
+                classify(message, prefilter)
+
+        timings = best_times([parse, intents], repeat)
+        results.append((strategy, *(seconds / len(corpus) * 1e9 for seconds in timings)))
+    return results
+
+
+def check_classify(corpus, seed=0):
+    """
+    Checks that classify finds the intent parse_input answers with, for every message.
+    Args:
+    - corpus (list of str): The messages
+    - seed (int): Seed of parse_input's random choices
+    Returns:
+    - list of str: The messages where they disagree
+    """
+    rng = random.Random(seed)
+    answered = []
+    instrumentation = enable_instrumentation()
+    instrumentation.after_match.append(lambda result, seconds: answered.append(result.intent))
+    try:
+        for message in corpus:
+            parse_input(message, rng=rng)
+    finally:
+        disable_instrumentation()
+    return [message for message, intent in zip(corpus, answered) if classify(message)[0].name != intent]
+
+
+def bench_sessions(count, turns, seed=0):
+    """
+    Measures, with tracemalloc, the memory held by many idle sessions that each answered a few messages, and the
+    cost of serializing and restoring one. A random.Random per session, as the Streamlit app used to keep, is
+    measured for comparison.
+    Args:
+    - count (int): Number of sessions
+    - turns (int): Number of messages answered by every session
+    - seed (int): Seed of the messages
+    Returns:
+    - dict: Bytes per session, bytes per random.Random, serialized size, and nanoseconds to serialize and restore
+    """
+    messages = generate_corpus(turns * 10, seed)
+    sessions = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for index in range(count):
+            session = Session(deadline=time.time() + 300, seed=index)
+            for turn in range(turns):
+                session.respond(messages[(index + turn) % len(messages)])
+            sessions.append(session)
+        per_session = (tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(sessions)) / count
+        before = tracemalloc.get_traced_memory()[0]
+        generators = [random.Random(index) for index in range(1000)]
+        per_generator = (tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(generators)) / len(generators)
+    finally:
+        tracemalloc.stop()
+    data = [session.to_bytes() for session in sessions[:10_000]]
+    start = time.perf_counter()
+    for session in sessions[:10_000]:
+        session.to_bytes()
+    serialize = (time.perf_counter() - start) / len(data) * 1e9
+    start = time.perf_counter()
+    for serialized in data:
+        Session.from_bytes(serialized)
+    restore = (time.perf_counter() - start) / len(data) * 1e9
+    return {"session_bytes": per_session, "random_bytes": per_generator, "serialized_bytes": len(data[0]),
+            "serialize_ns": serialize, "restore_ns": restore}
+
+
+# Long inputs that make backtracking patterns rescan the rest of the input, by the size of the input
+STRESS_INPUTS = {
+    "letters": lambda size: "a" * size,
+    "words": lambda size: ("the cat argued about python " * (size // 28 + 1))[:size],
+    "question marks": lambda size: "?" * size + "x",
+    "lines": lambda size: ("why?\n" * (size // 5 + 1))[:size] + "x",
+    "spaces": lambda size: "you are" + " " * size + "1",
+    "quotes": lambda size: "i don" + "'" * size + "x",
+    "too many": lambda size: "too " * (size // 4) + "1",
+}
+# Pieces of the patterns, so random concatenations come close to matching them in many ways
+FUZZ_FRAGMENTS = ["you", " are", "'", "re", " ", "  ", "?", "\n", "i don", "t", " believe", "too", "it will",
+                  "don't you understand", "no", " it is", "yes", "a", "1", ",", "agree, but", "İ", "\\n"]
+
+
+def generate_fuzz_corpus(size, length, seed=0):
+    """
+    Generates messages made of random pattern fragments.
+    Args:
+    - size (int): Number of messages to generate
+    - length (int): Longest message, in fragments
+    - seed (int): Seed for the generator
+    Returns:
+    - list of str: The generated messages
+    """
+    rng = random.Random(seed)
+    return ["".join(rng.choices(FUZZ_FRAGMENTS, k=rng.randint(0, length))) for _ in range(size)]
+
+
+def check_fuzz(corpus):
+    """
+    Checks the rewritten question pattern against the former .*\\?$, and the prefiltered and adaptive strategies
+    against the chain, on fuzzed messages.
+    Args:
+    - corpus (list of str): The messages to classify
+    Returns:
+    - list of tuple: The (message, what disagrees) pairs
+    """
+    former_question = compile_pattern(r".*\?$")
+    question = INTENT_MATCHER.intents[INTENT_MATCHER.intent_id("question") - 1].pattern
+    failures = [(message, "question pattern") for message in corpus
+                if (former_question.search(message) is None) != (question.search(message) is None)]
+    for prefilter in (True, "adaptive"):
+        failures += [(message, f"{prefilter} strategy") for message, _, _ in
+                     check_prefiltered(corpus, INTENT_MATCHER, prefilter)]
+    return failures
+
+
+def bench_stress(sizes, max_length=None, repeat=3):
+    """
+    Measures the time to answer one long message of every STRESS_INPUTS shape, at growing sizes, with every
+    matching strategy.
+    Args:
+    - sizes (list of int): The message sizes, in characters
+    - max_length (int or None): The engines' max_length, see ClinicEngine
+    - repeat (int): Number of runs per message, the fastest one is kept
+    Returns:
+    - dict: {shape: {strategy: [seconds per message at every size]}}
+    """
+    rng = random.Random(0)
+    strategies = {"chain": False, "prefiltered": True, "adaptive": "adaptive"}
+    results = {}
+    for shape, generate in STRESS_INPUTS.items():
+        messages = [generate(size) for size in sizes]
+        results[shape] = {}
+        for name, prefilter in strategies.items():
+            respond = ClinicEngine(prefilter=prefilter, max_length=max_length).respond
+            timings = []
+            for message in messages:
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    respond(message, rng)
+                    best = min(best, time.perf_counter() - start)
+                timings.append(best)
+            results[shape][name] = timings
+    return results
+
+
+# A phrase routed to every handler that decides between sub-cases, put last so the handler's checks cross the
+# whole message
+HANDLER_PHRASES = {"repetitions": "no it isn't", "never_always": "always", "emotions": "so uplifting",
+                   "absolute": "absolutely", "futility": "silly", "right_wrong": "wrong"}
+
+
+def bench_handlers(size, repeat=5):
+    """
+    Measures the time to match and to answer a long message routed to every handler of HANDLER_PHRASES: answering
+    with the input the matcher folded, and answering from an IntentMatch without it, whose handler folds the input
+    again, as handlers did when they lowered the input themselves.
+    Args:
+    - size (int): Length of the messages, in characters
+    - repeat (int): Number of runs, the fastest one is kept
+    Returns:
+    - dict: {intent: (match seconds, answer seconds, answer seconds folding again)}
+    """
+    rng = random.Random(0)
+    match = INTENT_MATCHER.match_adaptive
+    filler = " ".join(rng.choice(FILLER_WORDS[:14]) for _ in range(size // 5))
+    results = {}
+    for intent, phrase in HANDLER_PHRASES.items():
+        message = filler[:size - len(phrase) - 1] + " " + phrase
+        timings = [float("inf")] * 3
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = match(message)
+            matched = time.perf_counter()
+            result.respond(rng)
+            answered = time.perf_counter()
+            unfolded = IntentMatch(message, result.intent, result.match, result.handler, result.responses)
+            start_unfolded = time.perf_counter()
+            unfolded.respond(rng)
+            timings = [min(timing, seconds) for timing, seconds in zip(timings, (
+                matched - start, answered - matched, time.perf_counter() - start_unfolded))]
+        assert result.intent == intent, (intent, result.intent)
+        results[intent] = tuple(timings)
+    return results
+
+
+def check_handlers(corpus):
+    """
+    Checks that every message gets a response, also in upper case and with the letters that only match their
+    lowercase form under re.IGNORECASE: a handler deciding on a differently folded input finds none of its
+    sub-cases and answers None.
+    Args:
+    - corpus (list of str): The messages
+    Returns:
+    - list of str: The messages answered with None
+    """
+    variants = (str.upper, lambda message: message.replace("i", "\u0130"),
+                lambda message: message.replace("s", "\u017f"))
+    rng = random.Random(0)
+    return [variant(message) for message in corpus for variant in variants
+            if parse_input(variant(message), rng=rng) is None]
+
+
+class SyncTranscript:
+    """
+    Writes every exchange to a JSONL file on the reply path, one write and flush per message, as the baseline of
+    bench_transcripts.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, user_input, intent, response, seconds):
+        self._file.write(json.dumps({"timestamp": time.time(), "message": user_input, "intent": intent,
+                                     "response": response, "latency_us": seconds * 1e6}) + "\n")
+        self._file.flush()
+        return True
+
+    def close(self):
+        self._file.close()
+
+
+def bench_transcripts(corpus, directory, max_bytes=8 << 20):
+    """
+    Answers a corpus as fast as possible through a ClinicEngine without a transcript, with a TranscriptSink and
+    with synchronous writes, timing every reply, then closes the sink and counts the lines it wrote.
+    Args:
+    - corpus (list of str): The messages
+    - directory (str): Where the transcript files go
+    - max_bytes (int): Size at which the sink rotates its file
+    Returns:
+    - dict: {variant: latency_stats of the replies plus 'max_us'}, and under 'sink' its stats() after closing,
+      the number of lines found in its files and the seconds close() took
+    """
+    from clinic_transcripts import TranscriptSink
+
+    sink_path = os.path.join(directory, "sink.jsonl")
+    sink = TranscriptSink(sink_path, max_bytes=max_bytes, backups=1000)
+    variants = {"no transcript": None, "TranscriptSink": sink,
+                "synchronous writes": SyncTranscript(os.path.join(directory, "sync.jsonl"))}
+    clock = time.perf_counter_ns
+    rng = random.Random(0)
+    results = {}
+    for name, transcript in variants.items():
+        respond = ClinicEngine(prefilter="adaptive", transcript=transcript).respond
+        durations = []
+        for message in corpus:
+            start = clock()
+            respond(message, rng)
+            durations.append(clock() - start)
+        results[name] = dict(latency_stats(durations), max_us=max(durations) / 1000)
+    start = time.perf_counter()
+    sink.close()
+    close_seconds = time.perf_counter() - start
+    variants["synchronous writes"].close()
+    lines = 0
+    for file_name in os.listdir(directory):
+        if file_name.startswith("sink.jsonl"):
+            with open(os.path.join(directory, file_name), "rb") as transcript_file:
+                lines += sum(1 for _ in transcript_file)
+    results["sink"] = dict(sink.stats(), lines=lines, close_seconds=close_seconds)
+    return results
+
+
+def _store_worker(variant, path, first_id, sessions, operations, seed):
+    """
+    One worker process of bench_session_store: answers operations messages of sessions random sessions of its own,
+    reading every session from the store before answering and writing it back after, and times the store's calls.
+    """
+    from clinic_sessions import MemorySessionStore, SQLiteSessionStore
+
+    store = MemorySessionStore() if variant == "memory" else SQLiteSessionStore(path)
+    commit = store.flush if variant == "sqlite, commit per write" else None
+    messages = generate_corpus(1000, seed)
+    rng = random.Random(seed)
+    clock = time.perf_counter_ns
+    reads, writes = [], []
+    for index in range(operations):
+        session_id = f"session-{first_id + rng.randrange(sessions)}"
+        start = clock()
+        session = store.get(session_id)
+        reads.append(clock() - start)
+        if session is None:
+            session = Session(deadline=time.time() + 300, seed=index)
+        session.respond(messages[index % len(messages)])
+        start = clock()
+        store.put(session_id, session)
+        if commit is not None:
+            commit()
+        writes.append(clock() - start)
+    store.close()
+    return reads, writes
+
+
+def bench_session_store(processes, sessions, operations, directory):
+    """
+    Runs worker processes answering messages of many sessions through a session store, all sharing one database file
+    with the SQLite stores, and times every read and write of a session. Every process has its own sessions: a user only
+    sends a message once the previous one is answered. The in-memory store, private to every process, is the lower
+    bound; the SQLite store committing every write on the reply path shows what batching saves. Afterwards, the
+    turns stored in the database are checked against the messages answered, and a sweep of as many expired
+    sessions is timed.
+    Args:
+    - processes (int): Number of worker processes
+    - sessions (int): Number of sessions, split between the processes
+    - operations (int): Number of messages answered by every process
+    - directory (str): Where the database files go
+    Returns:
+    - dict: {variant: {'read': latency_stats, 'write': latency_stats, 'per_second': messages answered per second
+      by all processes, 'turns': turns stored, or None for the in-memory store}}, and under 'sweep' the number of
+      sessions swept and the seconds the sweep took
+    """
+    import sqlite3
+    from concurrent.futures import ProcessPoolExecutor
+
+    from clinic_sessions import SQLiteSessionStore
+
+    per_process = sessions // processes
+    results = {}
+    for variant in ("memory", "sqlite", "sqlite, commit per write"):
+        path = os.path.join(directory, f"{variant.replace(', ', '-').replace(' ', '-')}.db")
+        SQLiteSessionStore(path).close()  # Creates the database before the workers race to
+        reads, writes = [], []
+        with ProcessPoolExecutor(processes) as executor:
+            start = time.perf_counter()
+            futures = [executor.submit(_store_worker, variant, path, index * per_process, per_process, operations,
+                                       index) for index in range(processes)]
+            for future in futures:
+                process_reads, process_writes = future.result()
+                reads += process_reads
+                writes += process_writes
+            seconds = time.perf_counter() - start
+        turns = None
+        if variant != "memory":
+            with sqlite3.connect(path) as connection:
+                turns = sum(Session.from_bytes(data).turns for data, in connection.execute("SELECT data FROM sessions"))
+        results[variant] = {"read": latency_stats(reads), "write": latency_stats(writes),
+                            "per_second": processes * operations / seconds, "turns": turns}
+    store = SQLiteSessionStore(os.path.join(directory, "sweep.db"), ttl=0.0)
+    for index in range(sessions):
+        store.put(f"expired-{index}", Session(deadline=time.time() - 1))
+        store.put(f"active-{index}", Session(deadline=time.time() + 300))
+    store.flush()
+    start = time.perf_counter()
+    swept = store.sweep()
+    results["sweep"] = {"sessions": swept, "seconds": time.perf_counter() - start}
+    store.close()
+    return results
+
+
+def bench_parallel(corpus, worker_counts, chunk_size=1000):
+    """
+    Measures the throughput of parse_parallel for several numbers of worker processes.
+    Args:
+    - corpus (list of str): The messages to classify and answer
+    - worker_counts (iterable of int): The numbers of workers to try
+    - chunk_size (int): Number of messages sent to a worker at once
+    Returns:
+    - list of tuple: (workers, seconds, messages per second) for every number of workers
+    """
+    results = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        parse_parallel(corpus, workers=workers, chunk_size=chunk_size)
+        seconds = time.perf_counter() - start
+        results.append((workers, seconds, len(corpus) / seconds))
+    return results
+
+
+def bench_selection(calls, seed=0):
+    """
+    Measures the cost of choosing a response in isolation, for the shared random module and a session's own generator.
+    Args:
+    - calls (int): Number of choices per random source
+    - seed (int): Seed of the session's generator
+    Returns:
+    - list of tuple: (random source, nanoseconds per choice) for every random source
+    """
+    responses = tuple(INTENT_PHRASES[:5])
+    results = []
+    for name, rng in (("random module", random), ("random.Random", random.Random(seed))):
+        choice = rng.choice
+        start = time.perf_counter()
+        for _ in range(calls):
+            choice(responses)
+        results.append((name, (time.perf_counter() - start) / calls * 1e9))
+    return results
+
+
+def bench_allocations(corpus):
+    """
+    Measures, with tracemalloc, the memory allocated while the handlers answer each message.
+    The messages are matched beforehand, so only building the response is traced.
+    Args:
+    - corpus (list of str): The messages to answer
+    Returns:
+    - dict: Average peak bytes allocated per message, keyed by intent
+    """
+    matched = [INTENT_MATCHER.match(message) for message in corpus]
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for result in matched:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result.respond()
+            peaks.setdefault(result.intent, []).append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return {intent: sum(sizes) / len(sizes) for intent, sizes in peaks.items()}
+
+
+def generate_catalog(size):
+    """
+    Generates a catalog with the built-in intents followed by many synthetic ones, in the catalog file format.
+    Args:
+    - size (int): Number of synthetic intents to add
+    Returns:
+    - dict: The catalog
+    """
+    catalog = catalog_to_dict()
+    for index in range(size):
+        catalog["intents"].append({
+            "name": f"topic_{index}",
+            "pattern": rf"\b(topic{index}|subject number {index})\b",
+            "flags": "i",
+            "keywords": [f"topic{index}", f"subject number {index}"],
+            "responses": {"default": [f"Why does topic {index} matter to you?",
+                                      f"What would change your mind about topic {index}?"]},
+        })
+    return catalog
+
+
+def bench_catalog(size):
+    """
+    Measures how long a large catalog takes to load from a JSON file and compile, the first time and when it is
+    reloaded after one of its intents changed.
+    Args:
+    - size (int): Number of synthetic intents in the catalog
+    Returns:
+    - tuple: (seconds for the first load, seconds for the reload)
+    """
+    catalog = generate_catalog(size)
+    compile_pattern.cache_clear()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.json")
+        timings = []
+        for _ in range(2):
+            with open(path, "w", encoding="utf-8") as catalog_file:
+                json.dump(catalog, catalog_file)
+            start = time.perf_counter()
+            load_catalog(path)
+            timings.append(time.perf_counter() - start)
+            catalog["intents"][-1]["pattern"] = r"\b(an edited topic)\b"
+            catalog["intents"][-1]["keywords"] = ["an edited topic"]
+    return tuple(timings)
+
+
+def bench_session(idle_seconds=1.0, idle_reruns=20):
+    """
+    Drives the Streamlit app headlessly with streamlit's AppTest and measures the CPU time it uses: while a session
+    sits idle, per rerun without a new message, and per rerun that answers a message, whose wall-clock latency is
+    measured too.
+    Args:
+    - idle_seconds (float): How long to leave the session idle
+    - idle_reruns (int): Number of reruns without a new message
+    Returns:
+    - dict: CPU seconds while idle, per idle rerun and per answered message, latency per answered message, and
+      whether idle reruns left the conversation untouched
+    """
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "my_python_clinic_project1.py"))
+    app.run()
+    app.text_input[0].input("5").run()
+    messages = generate_corpus(20, seed=1)
+    start, start_wall = time.process_time(), time.perf_counter()
+    for message in messages:
+        app.chat_input[0].set_value(message).run()
+    per_message = (time.process_time() - start) / len(messages)
+    latency = (time.perf_counter() - start_wall) / len(messages)
+    replies = len(app.session_state["history"])
+    start = time.process_time()
+    time.sleep(idle_seconds)
+    idle = time.process_time() - start
+    start = time.process_time()
+    for _ in range(idle_reruns):
+        app.run()
+    per_idle_rerun = (time.process_time() - start) / idle_reruns
+    return {
+        "idle_cpu_seconds": idle,
+        "idle_rerun_cpu_seconds": per_idle_rerun,
+        "message_cpu_seconds": per_message,
+        "message_latency_seconds": latency,
+        "idle_reruns_untouched": replies == len(messages) == len(app.session_state["history"]),
+    }
+
+
+def bench_import(module, runs=7):
+    """
+    Imports a module in fresh interpreters, as a batch job or a worker starting up would, and reads the import time
+    that python -X importtime reports for it, including the modules it imports that were not loaded yet.
+    The first run compiles the bytecode, which every later run then loads, as in a deployment.
+    Args:
+    - module (str): The module to import
+    - runs (int): Number of measured imports
+    Returns:
+    - tuple: (median import time in milliseconds, whether the import loaded streamlit)
+    """
+    code = f"import sys, {module}; print('streamlit' in sys.modules)"
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    timings = []
+    for _ in range(runs + 1):
+        child = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                               check=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        # The lines read 'import time: <self us> | <cumulative us> | <indented module name>'
+        line = next(line for line in child.stderr.splitlines() if line.split("|")[-1].strip() == module)
+        timings.append(int(line.split("|")[1]) / 1000)
+    timings = sorted(timings[1:])
+    return timings[len(timings) // 2], child.stdout.strip() == "True"
+
+
+def run_bench(args):
+    results = bench_intents(generate_corpus(args.size), args.repeat)
+    for group, entries in results.items():
+        print(f"{group:<36} {'count':>8} {'per second':>12} {'p50 us':>9} {'p99 us':>9}")
+        for name, stats in entries.items():
+            print(f"  {name:<34} {stats['count']:>8} {stats['per_second']:>12,.0f} "
+                  f"{stats['p50_us']:>9.2f} {stats['p99_us']:>9.2f}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+def run_instrumentation(args):
+    results = bench_instrumentation(generate_corpus(args.size), args.repeat)
+    reference = results[0][1]
+    for variant, nanoseconds in results:
+        print(f"{variant:<32} {nanoseconds:9.0f} ns per message {nanoseconds / reference - 1:+7.1%}")
+    return 0
+
+
+def run_equivalence(args):
+    corpus = generate_corpus(args.size)
+    failed = False
+    for prefilter in (True, "adaptive"):
+        mismatches = check_prefiltered(corpus, INTENT_MATCHER, prefilter)
+        name = "adaptive" if prefilter == "adaptive" else "prefiltered"
+        for message, expected, actual in mismatches[:20]:
+            print(f"{message!r}: chain={expected} {name}={actual}")
+        print(f"{name} equivalence: {len(corpus) - len(mismatches)}/{len(corpus)} messages agree")
+        failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+
+def run_ordering(args):
+    for workload, phrases in SKEWED_PHRASES.items():
+        corpus = generate_skewed_corpus(args.size, phrases, args.share)
+        results = bench_ordering(corpus, args.repeat)
+        reference = results[0][1]
+        print(f"{args.share:.0%} {workload}:")
+        for strategy, nanoseconds in results:
+            print(f"  {strategy:<12} {nanoseconds:8.0f} ns per message {nanoseconds / reference - 1:+7.1%}")
+    return 0
+
+
+def run_cache(args):
+    rng = random.Random(0)
+    mixed = generate_corpus(args.size)
+    corpus = [rng.choice(REPEATED_MESSAGES) if rng.random() < args.share else message for message in mixed]
+    uncached, cached, stats = bench_cache(corpus, args.maxsize, args.repeat)
+    print(f"{args.share:.0%} repeated short messages, cache of {args.maxsize}:")
+    print(f"  uncached {uncached:8.0f} ns per message")
+    print(f"  cached   {cached:8.0f} ns per message {cached / uncached - 1:+7.1%}")
+    print(f"  hits {stats['hits']}, misses {stats['misses']}, evictions {stats['evictions']}, "
+          f"hit rate {stats['hit_rate']:.1%}")
+    return 0
+
+
+def write_messages(path, size, share, seed=0):
+    """
+    Writes a file of generated messages, one per line, of which a share are repeated short messages.
+    """
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as messages:
+        # Written in chunks, so the benchmark itself does not hold the corpus
+        for chunk in range(0, size, 100_000):
+            corpus = generate_corpus(min(100_000, size - chunk), seed=seed + chunk)
+            messages.writelines((rng.choice(REPEATED_MESSAGES) if rng.random() < share
+                                 else message.replace("\n", " ")) + "\n" for message in corpus)
+
+
+def run_cli(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "messages.txt")
+        write_messages(path, args.size, args.share)
+        megabytes = os.path.getsize(path) / 2 ** 20
+        print(f"{args.size:,} lines ({megabytes:.0f} MiB), {args.share:.0%} repeated short messages:")
+        for jsonl in (False, True):
+            for strategy, prefilter, cache_size in (("chain", False, 0), ("prefilter", True, 0),
+                                                    ("adaptive", "adaptive", 0), ("adaptive+cache", "adaptive", 4096)):
+                rate = bench_cli(path, jsonl, prefilter, cache_size)
+                print(f"  {'jsonl' if jsonl else 'responses':<10} {strategy:<16} {rate:12,.0f} lines/s")
+        small = os.path.join(directory, "small.txt")
+        write_messages(small, args.size // 10, args.share)
+        code = "import clinic_cli, os; clinic_cli.stream(open({!r}), open(os.devnull, 'wb'), jsonl=True)"
+        print(f"peak memory of clinic_cli --jsonl: {peak_memory(code.format(small)):.1f} MiB for "
+              f"{args.size // 10:,} lines, {peak_memory(code.format(path)):.1f} MiB for {args.size:,} lines")
+    return 0
+
+
+def run_ingest(args):
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (args.size // 10, args.size):
+            path = os.path.join(directory, f"transcripts-{size}.jsonl")
+            write_transcripts(path, size)
+            megabytes = os.path.getsize(path) / 2 ** 20
+            mapped_seconds, naive_seconds, agree = bench_ingest(path)
+            mapped_peak = peak_memory(f"import clinic_ingest; clinic_ingest.ingest({path!r})")
+            naive_peak = peak_memory(f"import clinic_bench; clinic_bench.naive_ingest({path!r})")
+            mapped_extraction, naive_extraction = bench_extraction(path)
+            print(f"{size:,} lines ({megabytes:.0f} MiB), histograms agree: {agree}")
+            print(f"  extracting the messages only: mapped {size / mapped_extraction:10,.0f} lines/s, "
+                  f"json.loads {size / naive_extraction:10,.0f} lines/s")
+            print(f"  mapped      {mapped_seconds:7.2f}s {size / mapped_seconds:10,.0f} lines/s "
+                  f"peak memory {mapped_peak:6.1f} MiB")
+            print(f"  read+loads  {naive_seconds:7.2f}s {size / naive_seconds:10,.0f} lines/s "
+                  f"peak memory {naive_peak:6.1f} MiB")
+    return 0
+
+
+def run_classify(args):
+    corpus = generate_corpus(args.size)
+    disagree = check_classify(corpus)
+    print(f"classify agrees with parse_input on {len(corpus) - len(disagree)}/{len(corpus)} messages")
+    for strategy, parse_ns, classify_ns in bench_classify(corpus, args.repeat):
+        print(f"  {strategy:<10} parse_input {parse_ns:8.0f} ns, classify {classify_ns:8.0f} ns per message "
+              f"{classify_ns / parse_ns - 1:+7.1%}")
+    return 1 if disagree else 0
+
+
+def run_sessions(args):
+    results = bench_sessions(args.count, args.turns)
+    total = results["session_bytes"] * args.count / 2 ** 20
+    print(f"{args.count:,} idle sessions after {args.turns} turns each: "
+          f"{results['session_bytes']:.0f} bytes per session, {total:.1f} MiB")
+    print(f"for comparison, one random.Random: {results['random_bytes']:.0f} bytes")
+    print(f"serialized: {results['serialized_bytes']} bytes, to_bytes {results['serialize_ns']:.0f} ns, "
+          f"from_bytes {results['restore_ns']:.0f} ns")
+    return 0
+
+
+def run_stress(args):
+    failures = check_fuzz(generate_fuzz_corpus(args.fuzz, 60))
+    for message, what in failures[:20]:
+        print(f"MISMATCH {what}: {message!r}")
+    print(f"fuzz: {args.fuzz - len({message for message, _ in failures})}/{args.fuzz} messages agree")
+    sizes = args.sizes
+    results = bench_stress(sizes, args.max_length, args.repeat)
+    # A linear matcher takes about sizes[-1] / sizes[0] times longer on the largest message, a capped one about
+    # as long as on a message of max_length characters
+    longest = min(sizes[-1], args.max_length or sizes[-1])
+    allowed = max(longest / sizes[0], 1) * args.slack
+    print(f"{'us per message':<28}" + "".join(f"{size:>12,}" for size in sizes))
+    slow = []
+    for shape, strategies in results.items():
+        for name, timings in strategies.items():
+            print(f"{shape + ', ' + name:<28}" + "".join(f"{seconds * 1e6:>12,.0f}" for seconds in timings))
+            if timings[-1] > max(timings[0], 1e-4) * allowed:
+                slow.append(f"{shape}, {name}")
+    for name in slow:
+        print(f"SUPERLINEAR {name}: more than {allowed:,.0f} times slower at {sizes[-1]:,} than at {sizes[0]:,}")
+    return 1 if failures or slow else 0
+
+
+def run_handlers(args):
+    unanswered = check_handlers(generate_corpus(args.check))
+    for message in unanswered[:20]:
+        print(f"UNANSWERED {message!r}")
+    for size in args.sizes:
+        print(f"{size:,} characters: {'match us':>10} {'answer us':>10} {'folding again':>14}")
+        for intent, (matched, answered, refolded) in bench_handlers(size, args.repeat).items():
+            print(f"  {intent:<20} {matched * 1e6:>10,.1f} {answered * 1e6:>10,.1f} {refolded * 1e6:>14,.1f}")
+    return 1 if unanswered else 0
+
+
+def run_transcripts(args):
+    corpus = generate_corpus(args.size)
+    with tempfile.TemporaryDirectory() as directory:
+        results = bench_transcripts(corpus, directory, args.max_bytes)
+    sink = results.pop("sink")
+    for name, stats in results.items():
+        print(f"{name:<20} {stats['per_second']:>10,.0f} replies/s, p50 {stats['p50_us']:6.1f} us, "
+              f"p99 {stats['p99_us']:6.1f} us, max {stats['max_us']:8.1f} us")
+    print(f"sink: {sink['written']:,} written in {sink['batches']} batches, {sink['dropped']} dropped, "
+          f"{sink['rotations']} rotations, {sink['lines']:,} lines on disk, close() took {sink['close_seconds']:.3f}s")
+    return 0 if sink["lines"] == sink["written"] == len(corpus) else 1
+
+
+def run_session_store(args):
+    with tempfile.TemporaryDirectory() as directory:
+        results = bench_session_store(args.processes, args.sessions, args.operations, directory)
+    sweep = results.pop("sweep")
+    failed = False
+    for variant, stats in results.items():
+        read, write = stats["read"], stats["write"]
+        print(f"{variant:<25} {stats['per_second']:>8,.0f} messages/s, read p50 {read['p50_us']:6.1f} us "
+              f"p99 {read['p99_us']:7.1f} us, write p50 {write['p50_us']:6.1f} us p99 {write['p99_us']:7.1f} us")
+        if stats["turns"] is not None and stats["turns"] != args.processes * args.operations:
+            print(f"LOST {variant}: {stats['turns']:,} turns stored for {args.processes * args.operations:,} messages")
+            failed = True
+    print(f"sweep of {sweep['sessions']:,} expired sessions among {2 * args.sessions:,}: "
+          f"{sweep['seconds'] * 1000:.1f} ms")
+    return 1 if failed or sweep["sessions"] != args.sessions else 0
+
+
+def run_parallel(args):
+    corpus = generate_corpus(args.size)
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    for workers, seconds, rate in bench_parallel(corpus, worker_counts, args.chunk_size):
+        print(f"workers={workers:<3} {seconds:8.3f}s {rate:12,.0f} messages/s")
+    return 0
+
+
+def run_allocations(args):
+    corpus = generate_corpus(args.size)
+    peaks = bench_allocations(corpus)
+    counts = Counter(INTENT_MATCHER.match(message).intent for message in corpus)
+    for intent, peak in sorted(peaks.items()):
+        print(f"{intent:<22} {peak:8.1f} bytes per message")
+    average = sum(peaks[intent] * count for intent, count in counts.items()) / len(corpus)
+    print(f"{'all messages':<22} {average:8.1f} bytes per message")
+    return 0
+
+
+def run_catalog(args):
+    first_seconds, reload_seconds = bench_catalog(args.intents)
+    print(f"catalog of {args.intents} intents: first load {first_seconds:.3f}s, "
+          f"reload after editing one intent {reload_seconds:.3f}s")
+    return 0
+
+
+def run_session(args):
+    results = bench_session(args.idle_seconds)
+    print(f"CPU while idle for {args.idle_seconds}s: {results['idle_cpu_seconds'] * 1000:.1f} ms")
+    print(f"CPU per rerun without a message: {results['idle_rerun_cpu_seconds'] * 1000:.1f} ms")
+    print(f"CPU per rerun answering a message: {results['message_cpu_seconds'] * 1000:.1f} ms")
+    print(f"latency per rerun answering a message: {results['message_latency_seconds'] * 1000:.1f} ms")
+    print(f"idle reruns left the conversation untouched: {results['idle_reruns_untouched']}")
+    return 0 if results["idle_reruns_untouched"] else 1
+
+
+def run_imports(args):
+    failed = False
+    for module in ("clinic_core", "my_python_clinic_project1", "streamlit"):
+        milliseconds, loads_streamlit = bench_import(module, args.runs)
+        print(f"import {module:<28} {milliseconds:8.1f} ms" + ("  (loads streamlit)" if loads_streamlit else ""))
+        if module == "clinic_core" and milliseconds > args.limit:
+            print(f"SLOW clinic_core takes more than {args.limit:g} ms to import")
+            failed = True
+        if module != "streamlit" and loads_streamlit:
+            print(f"HEAVY {module} imports streamlit")
+            failed = True
+    return 1 if failed else 0
+
+
+def run_selection(args):
+    for name, nanoseconds in bench_selection(args.calls):
+        print(f"{name:<15} {nanoseconds:8.1f} ns per choice")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks and consistency checks for the argument clinic")
+    commands = parser.add_subparsers(dest="command")
+    bench = commands.add_parser("bench", help="per-intent throughput and latency of parse_input and the handlers")
+    bench.add_argument("--size", type=int, default=20_000)
+    bench.add_argument("--repeat", type=int, default=5)
+    bench.add_argument("--save", metavar="PATH", help="write the results to a JSON file")
+    bench.add_argument("--baseline", metavar="PATH", help="fail if slower than the results in this JSON file")
+    bench.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown against the baseline")
+    bench.set_defaults(run=run_bench)
+    instrumentation = commands.add_parser("instrumentation", help="overhead of the parse_input instrumentation")
+    instrumentation.add_argument("--size", type=int, default=20_000)
+    instrumentation.add_argument("--repeat", type=int, default=5)
+    instrumentation.set_defaults(run=run_instrumentation)
+    equivalence = commands.add_parser("equivalence",
+                                      help="check the prefiltered and adaptive matchers against the chain")
+    equivalence.add_argument("--size", type=int, default=100_000)
+    equivalence.set_defaults(run=run_equivalence)
+    ordering = commands.add_parser("ordering", help="fixed chain against keyword checks on skewed workloads")
+    ordering.add_argument("--size", type=int, default=20_000)
+    ordering.add_argument("--share", type=float, default=0.8, help="fraction of messages hitting the skewed intent")
+    ordering.add_argument("--repeat", type=int, default=5)
+    ordering.set_defaults(run=run_ordering)
+    cache = commands.add_parser("cache", help="parse_input with and without the classification cache")
+    cache.add_argument("--size", type=int, default=50_000)
+    cache.add_argument("--share", type=float, default=0.6, help="fraction of repeated short messages")
+    cache.add_argument("--maxsize", type=int, default=4096)
+    cache.add_argument("--repeat", type=int, default=5)
+    cache.set_defaults(run=run_cache)
+    cli = commands.add_parser("cli", help="lines per second streamed through clinic_cli")
+    cli.add_argument("--size", type=int, default=500_000)
+    cli.add_argument("--share", type=float, default=0.6, help="fraction of repeated short messages")
+    cli.set_defaults(run=run_cli)
+    ingest = commands.add_parser("ingest", help="memory-mapped JSONL ingestion against reading and decoding lines")
+    ingest.add_argument("--size", type=int, default=500_000)
+    ingest.set_defaults(run=run_ingest)
+    classify_command = commands.add_parser("classify", help="classify against parse_input")
+    classify_command.add_argument("--size", type=int, default=20_000)
+    classify_command.add_argument("--repeat", type=int, default=5)
+    classify_command.set_defaults(run=run_classify)
+    sessions = commands.add_parser("sessions", help="memory held by many idle Sessions, and their serialization")
+    sessions.add_argument("--count", type=int, default=100_000)
+    sessions.add_argument("--turns", type=int, default=5)
+    sessions.set_defaults(run=run_sessions)
+    parallel = commands.add_parser("parallel", help="throughput of parse_parallel at 1, 2, 4 and N workers")
+    parallel.add_argument("--size", type=int, default=200_000)
+    parallel.add_argument("--chunk-size", type=int, default=1000)
+    parallel.set_defaults(run=run_parallel)
+    allocations = commands.add_parser("allocations", help="memory allocated by the handlers per message (tracemalloc)")
+    allocations.add_argument("--size", type=int, default=20_000)
+    allocations.set_defaults(run=run_allocations)
+    catalog = commands.add_parser("catalog", help="time to load and compile a large JSON catalog")
+    catalog.add_argument("--intents", type=int, default=5000)
+    catalog.set_defaults(run=run_catalog)
+    session = commands.add_parser("session", help="CPU used by a headless Streamlit session, idle and answering")
+    session.add_argument("--idle-seconds", type=float, default=1.0)
+    session.set_defaults(run=run_session)
+    selection = commands.add_parser("selection", help="cost of choosing a response with each random source")
+    selection.add_argument("--calls", type=int, default=1_000_000)
+    selection.set_defaults(run=run_selection)
+    stress = commands.add_parser("stress", help="answer time of long adversarial messages, and fuzzed equivalence")
+    stress.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    stress.add_argument("--max-length", type=int, help="the engines' cap on the characters answered")
+    stress.add_argument("--repeat", type=int, default=3)
+    stress.add_argument("--slack", type=float, default=3.0, help="allowed growth beyond linear")
+    stress.add_argument("--fuzz", type=int, default=20_000, help="number of fuzzed messages")
+    stress.set_defaults(run=run_stress)
+    handlers = commands.add_parser("handlers", help="answer time of long messages, and responses of folded inputs")
+    handlers.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 1_000_000])
+    handlers.add_argument("--repeat", type=int, default=5)
+    handlers.add_argument("--check", type=int, default=20_000, help="number of messages checked for responses")
+    handlers.set_defaults(run=run_handlers)
+    transcripts = commands.add_parser("transcripts", help="reply latency with and without transcript recording")
+    transcripts.add_argument("--size", type=int, default=200_000)
+    transcripts.add_argument("--max-bytes", type=int, default=8 << 20, help="size at which the sink rotates")
+    transcripts.set_defaults(run=run_transcripts)
+    session_store = commands.add_parser("sessionstore", help="session store latency from several worker processes")
+    session_store.add_argument("--processes", type=int, default=4)
+    session_store.add_argument("--sessions", type=int, default=5000, help="active sessions, split between processes")
+    session_store.add_argument("--operations", type=int, default=20_000, help="messages answered by every process")
+    session_store.set_defaults(run=run_session_store)
+    imports = commands.add_parser("imports", help="cold import time of the engine, the app module and streamlit")
+    imports.add_argument("--runs", type=int, default=7)
+    imports.add_argument("--limit", type=float, default=10.0, help="fail if clinic_core takes longer, in ms")
+    imports.set_defaults(run=run_imports)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(["equivalence"])
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Streams messages through the argument clinic, one message per line, for shell pipelines and batch jobs.
+
+    python -m clinic_cli < transcript.txt                     # one response per line
+    python -m clinic_cli --jsonl transcript.txt > out.jsonl   # one JSON record per line
+
+Input is read and output written in batches, so memory stays bounded whatever the size of the input.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from functools import partial
+from itertools import islice
+from json.encoder import encode_basestring
+
+from clinic_core import DEFAULT_RNG, INTENT_MATCHER, ClassificationCache, load_catalog
+
+
+def stream(lines, output, jsonl=False, prefilter="adaptive", rng=DEFAULT_RNG, matcher=None, cache=None,
+           batch_size=4096, max_length=None):
+    """
+    Answers every line and writes the results, batch_size lines at a time.
+    Args:
+    - lines (iterable of str): The messages, with or without their line ending
+    - output (binary file): Receives one line per message, UTF-8 encoded
+    - jsonl (bool): Write JSON records with the message, intent, response and latency instead of the responses
+    - prefilter (bool or str): The matching strategy, see IntentMatcher.match_function
+    - rng (random.Random): The random source choosing the responses
+    - matcher (IntentMatcher or None): The catalog to answer from, INTENT_MATCHER if None
+    - cache (ClassificationCache or None): Cache of the matcher's classifications, not cached if None
+    - batch_size (int): Number of lines read and written at once
+    - max_length (int or None): Only the first max_length characters of a line are matched and answered,
+      None for whole lines
+    Returns:
+    - int: Number of messages answered
+    """
+    match = (matcher or INTENT_MATCHER).match_function(prefilter)
+    if cache is not None:
+        match = partial(cache.match, match)
+    if max_length is not None:
+        match = partial(_match_prefix, match, max_length)
+    clock = time.perf_counter_ns
+    lines = iter(lines)
+    count = 0
+    for batch in iter(lambda: list(islice(lines, batch_size)), []):
+        records = []
+        append = records.append
+        if jsonl:
+            for line in batch:
+                user_input = line[:-1] if line.endswith("\n") else line
+                start = clock()
+                result = match(user_input)
+                response = result.respond(rng)
+                latency = (clock() - start) / 1000
+                append(f'{{"message": {encode_basestring(user_input)}, "intent": {encode_basestring(result.intent)}, '
+                       f'"response": {encode_basestring(response)}, "latency_us": {latency:.1f}}}\n')
+        else:
+            for line in batch:
+                append(match(line[:-1] if line.endswith("\n") else line).respond(rng))
+            append("")  # The last line's ending
+        output.write(("" if jsonl else "\n").join(records).encode("utf-8"))
+        count += len(batch)
+    output.flush()
+    return count
+
+
+def _match_prefix(match, max_length, user_input):
+    return match(user_input[:max_length])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer messages from stdin or files, one per line")
+    parser.add_argument("files", nargs="*", help="files to read, stdin if none")
+    parser.add_argument("--jsonl", action="store_true", help="write JSON records with intent, response and latency")
+    parser.add_argument("--strategy", choices=("chain", "prefilter", "adaptive"), default="adaptive",
+                        help="how the patterns are searched, all strategies find the same intent")
+    parser.add_argument("--catalog", help="JSON catalog to answer from instead of the built-in intents")
+    parser.add_argument("--cache-size", type=int, default=4096, help="classifications cached, 0 to disable")
+    parser.add_argument("--seed", type=int, help="seed of the responses' random choices")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--max-length", type=int, help="only match the first characters of every line")
+    args = parser.parse_args(argv)
+    prefilter = {"chain": False, "prefilter": True, "adaptive": "adaptive"}[args.strategy]
+    matcher = load_catalog(args.catalog) if args.catalog else None
+    cache = ClassificationCache(args.cache_size) if args.cache_size > 0 else None
+    rng = random.Random(args.seed)
+    output = sys.stdout.buffer
+    try:
+        for path in args.files or ["-"]:
+            if path == "-":
+                lines = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", errors="replace")
+                stream(lines, output, args.jsonl, prefilter, rng, matcher, cache, args.batch_size, args.max_length)
+            else:
+                with open(path, encoding="utf-8", errors="replace") as lines:
+                    stream(lines, output, args.jsonl, prefilter, rng, matcher, cache, args.batch_size, args.max_length)
+    except BrokenPipeError:
+        # The reader went away, e.g. `| head`; stop quietly. Python flushes stdout again at exit, so point it at
+        # devnull to keep that flush from failing too
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
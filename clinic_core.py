@@ -0,0 +1,1843 @@
+"""
+The argument clinic's engine: the intent table, the matching strategies, the handlers and their responses, catalog
+files and sessions. It only uses the standard library, so batch jobs, servers and tests import it in milliseconds;
+the Streamlit app is my_python_clinic_project1. Modules only a few functions need, such as json and hashlib for
+catalog files, are imported by those functions.
+"""
+import os
+import re
+import random
+import struct
+import threading
+import time
+import warnings
+from array import array
+from bisect import bisect_left
+from collections import deque, namedtuple
+from functools import lru_cache, partial
+from itertools import accumulate, islice
+
+# Fallback random source of the handlers; sessions pass their own seedable random.Random instead
+DEFAULT_RNG = random.Random()
+
+
+class Intent(namedtuple("Intent", ["name", "pattern", "handler", "keywords"])):
+    """
+    A single entry of the intent table: the compiled pattern and the function that answers it.
+    Args:
+    - name (str): Short identifier of the intent, e.g. 'negation'
+    - pattern (re.Pattern): The compiled regular expression that detects the intent
+    - handler (callable): The handle_* function that builds the response
+    - keywords (tuple of str or None): Lowercase literals of which at least one occurs in every match,
+      or None if the pattern has to be searched on every input
+    """
+    __slots__ = ()
+
+
+class IntentId(int):
+    """
+    Enum-like identifier of an intent of an IntentMatcher: a small int, 0 for the default case and then the intents
+    in priority order, that also carries the intent's name. Unlike an enum.IntEnum it accepts any intent name and
+    costs nothing to build for a catalog of thousands of intents.
+    Args:
+    - value (int): The identifier
+    - name (str): Name of the intent
+    """
+
+    def __new__(cls, value, name):
+        intent_id = super().__new__(cls, value)
+        intent_id.name = name
+        return intent_id
+
+    def __repr__(self):
+        return f"<IntentId.{self.name}: {int(self)}>"
+
+    def __str__(self):
+        return self.name
+
+    def __reduce__(self):
+        return IntentId, (int(self), self.name)
+
+
+class IntentMatch:
+    """
+    The result of matching a user's input against the intent table, which is also the message the handler gets.
+    The folded form of the input, which the handlers take their decisions on, is the one the matcher checked the
+    keywords against when it folded the input, and is otherwise computed on first use and then kept; either way a
+    message is folded at most once, and not at all when neither the matcher nor the handler looks at it.
+    Args:
+    - text (str): The user's input
+    - intent (str): Name of the detected intent, or 'default' if no pattern matched
+    - match (re.Match or None): The match object of the detected pattern, None for the default case
+    - handler (callable): The handle_* function that builds the response
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - folded (str or None): The input as folded by fold(), if the matcher already folded it
+    """
+    __slots__ = ("text", "intent", "match", "handler", "responses", "_lowered", "_folded")
+
+    def __init__(self, text, intent, match, handler, responses, folded=None):
+        self.text = text
+        self.intent = intent
+        self.match = match
+        self.handler = handler
+        self.responses = responses
+        self._lowered = None
+        self._folded = folded
+
+    @property
+    def folded(self):
+        """
+        str: The user's input folded for caseless comparisons, see fold().
+        """
+        if self._folded is None:
+            self._folded = fold(self.text)
+        return self._folded
+
+    @property
+    def lowered(self):
+        """
+        str: The user's input in lowercase.
+        """
+        if self._lowered is None:
+            self._lowered = self.text.lower()
+        return self._lowered
+
+    def respond(self, rng=DEFAULT_RNG):
+        """
+        Calls the handler of the detected intent with this message and the intent's response sets.
+        Args:
+        - rng (random.Random): The random source choosing the response
+        Returns:
+        - str: The response generated by the handler
+        """
+        return self.handler(self, self.responses, rng)
+
+
+class IntentMatcher:
+    """
+    Holds the compiled intent patterns in priority order and finds the first one matching a user's input.
+    The patterns are compiled once, when the matcher is built, instead of on every message.
+    """
+
+    def __init__(self, intents, default_handler, responses):
+        """
+        Args:
+        - intents (list of Intent): The intent table, highest priority first
+        - default_handler (callable): The function called when no pattern matches
+        - responses (dict): The response sets of every intent and of 'default', keyed by intent name
+        """
+        self.intents = tuple(intents)
+        self.responses = responses
+        self.default_handler = default_handler
+        # Every intent with keywords is only a candidate when one of them occurs in the input;
+        # intents without keywords are always candidates
+        keywords = {}
+        for index, intent in enumerate(self.intents):
+            for keyword in intent.keywords or ():
+                keywords[keyword] = keywords.get(keyword, 0) | 1 << index
+        self._always_mask = sum(1 << index for index, intent in enumerate(self.intents) if not intent.keywords)
+        self._keyword_masks = {}
+        for found in keywords:
+            mask = 0
+            for length in range(1, len(found) + 1):
+                mask |= keywords.get(found[:length], 0)
+            self._keyword_masks[found] = mask
+        # The keyword scanner is compiled by the first prefiltered match, which keeps building a matcher, and
+        # importing this module, fast for callers that never prefilter
+        self._keyword_scanner = None
+        # State of match_adaptive: the keywords of every intent, most often found first, and how often each was found
+        self._plan = tuple((intent, intent.keywords, dict.fromkeys(intent.keywords or (), 0))
+                           for intent in self.intents)
+        self._adaptive_calls = 0
+        self._intent_ids = None
+        self._ids_by_name = None
+
+    @property
+    def intent_ids(self):
+        """
+        tuple of IntentId: The identifiers of the intents, indexed by their value: the default case, then the
+        intents in priority order. Built on first use, so reloading a catalog does not pay for it.
+        """
+        if self._intent_ids is None:
+            names = ["default"] + [intent.name for intent in self.intents]
+            intent_ids = tuple(IntentId(value, name) for value, name in enumerate(names))
+            self._ids_by_name = {intent_id.name: intent_id for intent_id in intent_ids}
+            self._intent_ids = intent_ids
+        return self._intent_ids
+
+    def intent_id(self, name):
+        """
+        Looks up the identifier of an intent.
+        Args:
+        - name (str): Name of the intent, or 'default'
+        Returns:
+        - IntentId: The identifier
+        Raises:
+        - KeyError: If the matcher has no such intent
+        """
+        if self._ids_by_name is None:
+            self.intent_ids  # Builds the identifiers
+        return self._ids_by_name[name]
+
+    def classify(self, user_input, prefilter=False):
+        """
+        Finds the intent of an input without answering it: no handler runs, no response is chosen.
+        It uses the same matching as parse_input, so both always agree on the intent.
+        Args:
+        - user_input (str): The user's input
+        - prefilter (bool or str): The matching strategy, see match_function
+        Returns:
+        - tuple: (IntentId, the groups captured by the intent's pattern, empty for the default case)
+        """
+        result = self.match_function(prefilter)(user_input)
+        if result.match is None:
+            return self.intent_ids[0], ()
+        return self.intent_id(result.intent), result.match.groups()
+
+    def match_function(self, prefilter=False):
+        """
+        Picks the matching strategy; all of them find the same intent.
+        Args:
+        - prefilter (bool or str): False for match, True for match_prefiltered, 'adaptive' for match_adaptive
+        Returns:
+        - callable: The bound method
+        """
+        if prefilter == "adaptive":
+            return self.match_adaptive
+        return self.match_prefiltered if prefilter else self.match
+
+    def match(self, user_input):
+        """
+        Searches the patterns in priority order, running each search at most once.
+        Args:
+        - user_input (str): The user's input
+        Returns:
+        - IntentMatch: The first matching intent, or the default case if no pattern matches
+        """
+        for intent in self.intents:
+            match = intent.pattern.search(user_input)
+            if match:
+                return IntentMatch(user_input, intent.name, match, intent.handler, self.responses[intent.name])
+        return IntentMatch(user_input, "default", None, self.default_handler, self.responses["default"])
+
+    def match_prefiltered(self, user_input):
+        """
+        Finds the same intent as match(), but first scans the input once for the keywords of all intents
+        and then only searches the patterns whose keywords were found, still in priority order.
+        Inputs that match nothing usually cost that single scan.
+        Args:
+        - user_input (str): The user's input
+        Returns:
+        - IntentMatch: The first matching intent, or the default case if no pattern matches
+        """
+        candidates = self._always_mask
+        folded = None
+        scanner = self._keyword_scanner
+        if scanner is None and self._keyword_masks:
+            # A lookahead tries every position and reports the longest keyword starting there, so a hit also
+            # stands for all the keywords that are a prefix of it
+            scanner = self._keyword_scanner = compile_pattern(f"(?=({_keyword_trie(self._keyword_masks)}))")
+        if scanner is not None:
+            folded = fold(user_input)
+            for found in set(scanner.findall(folded)):
+                candidates |= self._keyword_masks[found]
+        while candidates:
+            lowest = candidates & -candidates
+            intent = self.intents[lowest.bit_length() - 1]
+            match = intent.pattern.search(user_input)
+            if match:
+                return IntentMatch(user_input, intent.name, match, intent.handler, self.responses[intent.name], folded)
+            candidates ^= lowest
+        return IntentMatch(user_input, "default", None, self.default_handler, self.responses["default"], folded)
+
+    def match_adaptive(self, user_input, window=1000):
+        """
+        Finds the same intent as match(), walking the patterns in priority order but skipping every pattern
+        none of whose keywords occurs in the input; a substring check costs a fraction of a failed search.
+        The keywords of an intent are checked most often found first, as observed over the last messages,
+        so the intents a workload hits most pass their check after a single keyword.
+        Args:
+        - user_input (str): The user's input
+        - window (int): Number of messages between two updates of the keyword order
+        Returns:
+        - IntentMatch: The first matching intent, or the default case if no pattern matches
+        """
+        folded = fold(user_input)
+        self._adaptive_calls += 1
+        if self._adaptive_calls >= window:
+            self._reorder_keywords()
+        for intent, keywords, hits in self._plan:
+            if keywords is not None:
+                for keyword in keywords:
+                    if keyword in folded:
+                        hits[keyword] += 1
+                        break
+                else:
+                    continue
+            match = intent.pattern.search(user_input)
+            if match:
+                return IntentMatch(user_input, intent.name, match, intent.handler, self.responses[intent.name], folded)
+        return IntentMatch(user_input, "default", None, self.default_handler, self.responses["default"], folded)
+
+    def _reorder_keywords(self):
+        """
+        Sorts the keywords of every intent by how often they were found, and halves the counts, so the order
+        follows changes of the workload. Concurrent callers may lose a few counts, which only affects the order.
+        """
+        self._adaptive_calls = 0
+        plan = []
+        for intent, keywords, hits in self._plan:
+            if keywords is not None:
+                keywords = tuple(sorted(keywords, key=hits.__getitem__, reverse=True))
+                for keyword in keywords:
+                    hits[keyword] //= 2
+            plan.append((intent, keywords, hits))
+        self._plan = tuple(plan)
+
+
+def _keyword_trie(keywords):
+    """
+    Builds a regular expression matching the longest keyword at a position, shaped as a trie of the keywords,
+    so each position costs one step per character instead of one attempt per keyword.
+    Args:
+    - keywords (iterable of str): The keywords
+    Returns:
+    - str: The regular expression
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = None  # A keyword ends here
+
+    def render(node):
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return render(trie)
+
+
+@lru_cache(maxsize=65536)
+def compile_pattern(pattern, flags=0):
+    """
+    Compiles a regular expression, reusing the result for the same pattern and flags. Reloading a catalog
+    therefore only compiles the patterns that changed.
+    Args:
+    - pattern (str): The regular expression
+    - flags (int): The re module flags
+    Returns:
+    - re.Pattern: The compiled pattern
+    """
+    return re.compile(pattern, flags)
+
+
+# re.IGNORECASE matches the Turkish dotted and dotless i against 'i', casefold() alone does not
+_DOTTED_I = str.maketrans({"\u0130": "i", "\u0131": "i"})
+
+
+def fold(text):
+    """
+    Folds a text for caseless comparisons the way re.IGNORECASE compares, which lower() does not do for
+    characters such as the dotted capital I or the long s. The keywords of the matchers and the handlers'
+    decisions are all checked against this form.
+    Args:
+    - text (str): The text
+    Returns:
+    - str: The folded text
+    """
+    if text.isascii():
+        return text.casefold()  # Checking is free, and the translation would copy the text once more
+    return text.translate(_DOTTED_I).casefold()
+
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 1e-1)
+
+
+class Instrumentation:
+    """
+    Counters, latency histograms and hooks around the matching and the handlers of parse_input, iter_parse and
+    parse_many. It is only consulted once enabled with enable_instrumentation; until then parse_input pays a
+    single None check.
+    Hooks are plain callables appended to the lists:
+    - before_match: called as hook(user_input)
+    - after_match: called as hook(result, seconds), result being the IntentMatch
+    - after_handler: called as hook(result, response, seconds)
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Args:
+        - buckets (tuple of float): Upper bounds, in seconds, of the latency histogram buckets, ascending
+        """
+        self.buckets = tuple(buckets)
+        self.before_match = []
+        self.after_match = []
+        self.after_handler = []
+        self._lock = threading.Lock()
+        self._stats = {}  # intent -> {"match": [bucket counts..., sum], "handler": [...]}
+
+    def match(self, match, user_input):
+        """
+        Runs a matcher method, timing it and calling the match hooks.
+        Args:
+        - match (callable): IntentMatcher.match, match_prefiltered or match_adaptive
+        - user_input (str): The user's input
+        Returns:
+        - IntentMatch: The result of the matcher
+        """
+        for hook in self.before_match:
+            hook(user_input)
+        start = time.perf_counter()
+        result = match(user_input)
+        seconds = time.perf_counter() - start
+        self._observe(result.intent, "match", seconds)
+        for hook in self.after_match:
+            hook(result, seconds)
+        return result
+
+    def respond(self, result, rng=DEFAULT_RNG):
+        """
+        Runs the handler of a match, timing it and calling the handler hooks.
+        Args:
+        - result (IntentMatch): The detected intent
+        - rng (random.Random): The random source choosing the response
+        Returns:
+        - str: The response generated by the handler
+        """
+        start = time.perf_counter()
+        response = result.respond(rng)
+        seconds = time.perf_counter() - start
+        self._observe(result.intent, "handler", seconds)
+        for hook in self.after_handler:
+            hook(result, response, seconds)
+        return response
+
+    def _observe(self, intent, stage, seconds):
+        """
+        Adds one latency to the histogram of an intent's stage.
+        """
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            stats = self._stats.get(intent)
+            if stats is None:
+                stats = self._stats[intent] = {"match": [0] * (len(self.buckets) + 2),
+                                               "handler": [0] * (len(self.buckets) + 2)}
+            histogram = stats[stage]
+            histogram[bucket] += 1
+            histogram[-1] += seconds
+
+    def snapshot(self):
+        """
+        Returns the statistics gathered so far.
+        Returns:
+        - dict: For every intent, the number of messages and, for its 'match' and 'handler' stages, the count,
+          the sum of the latencies in seconds and the cumulative count of every bucket, keyed by its upper bound
+        """
+        with self._lock:
+            stats = {intent: {stage: list(histogram) for stage, histogram in stages.items()}
+                     for intent, stages in self._stats.items()}
+        snapshot = {}
+        for intent, stages in sorted(stats.items()):
+            snapshot[intent] = {"messages": sum(stages["match"][:-1])}
+            for stage, histogram in stages.items():
+                cumulative = list(accumulate(histogram[:-1]))
+                snapshot[intent][stage] = {
+                    "count": cumulative[-1],
+                    "sum": histogram[-1],
+                    "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], cumulative)),
+                }
+        return snapshot
+
+    def to_json(self):
+        """
+        Returns:
+        - str: The snapshot as JSON
+        """
+        import json
+
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self):
+        """
+        Returns:
+        - str: The snapshot in the Prometheus text exposition format
+        """
+        # Intent names come from the catalog: label values escape backslashes, quotes and line feeds
+        snapshot = {intent.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"): stats
+                    for intent, stats in self.snapshot().items()}
+        lines = ["# HELP clinic_messages_total Messages answered, by detected intent.",
+                 "# TYPE clinic_messages_total counter"]
+        lines += [f'clinic_messages_total{{intent="{intent}"}} {stats["messages"]}'
+                  for intent, stats in snapshot.items()]
+        for stage in ("match", "handler"):
+            metric = f"clinic_{stage}_seconds"
+            lines += [f"# HELP {metric} Latency of the {stage} stage, by detected intent.",
+                      f"# TYPE {metric} histogram"]
+            for intent, stats in snapshot.items():
+                histogram = stats[stage]
+                lines += [f'{metric}_bucket{{intent="{intent}",le="{bound}"}} {count}'
+                          for bound, count in histogram["buckets"].items()]
+                lines.append(f'{metric}_sum{{intent="{intent}"}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{intent="{intent}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+_instrumentation = None
+
+
+def enable_instrumentation(instrumentation=None):
+    """
+    Starts instrumenting parse_input, iter_parse and parse_many in this process.
+    Args:
+    - instrumentation (Instrumentation or None): The instrumentation to use, a new one if None
+    Returns:
+    - Instrumentation: The instrumentation now in use
+    """
+    global _instrumentation
+    _instrumentation = instrumentation or Instrumentation()
+    return _instrumentation
+
+
+def disable_instrumentation():
+    """
+    Stops instrumenting parse_input, iter_parse and parse_many.
+    """
+    global _instrumentation
+    _instrumentation = None
+
+
+class ClassificationCache:
+    """
+    A bounded, thread-safe LRU cache of classifications: the detected intent and the match with its captured
+    words, keyed on the normalized input. Only the matching is cached; every hit returns a new IntentMatch,
+    so the handler still draws a fresh response from the session's random source.
+    The handlers quote the user's words and look at their case, so by default only identical inputs share an
+    entry; a normalize function must only merge inputs that get the same intent and the same captured words.
+    An entry keeps its whole input alive, as the key and in the match, so inputs longer than max_length are
+    classified without the cache: the cache is for short repeated messages, and 4096 entries of pasted
+    megabytes would hold gigabytes. Entries therefore stay under maxsize * max_length characters in total.
+    """
+
+    def __init__(self, maxsize=4096, normalize=None, max_length=256):
+        """
+        Args:
+        - maxsize (int): Number of classifications kept; the least recently used one is evicted beyond that
+        - normalize (callable or None): Maps an input to its cache key, the input itself if None
+        - max_length (int): Longest input cached, in characters; longer inputs are classified every time
+        """
+        self.maxsize = maxsize
+        self.normalize = normalize
+        self.max_length = max_length
+        self._classify = None
+        self._bound = (None, None)  # The cached classification and the match function it caches, swapped together
+        self._retired = (0, 0, 0)  # hits, misses and evictions of the caches of earlier match functions
+        self._lock = threading.Lock()
+
+    def match(self, match, user_input):
+        """
+        Classifies an input, from the cache if it was seen recently and is at most max_length characters long.
+        A different match function, e.g. the one of a reloaded catalog, starts a new cache.
+        Args:
+        - match (callable): The IntentMatcher method classifying on a miss
+        - user_input (str): The user's input
+        Returns:
+        - IntentMatch: The detected intent
+        """
+        if len(user_input) > self.max_length:
+            return match(user_input)
+        # Read once: clear() and _bind() replace the pair under the lock, between any two reads here
+        classify, bound = self._bound
+        if match != bound:
+            classify = self._bind(match)
+        key = user_input if self.normalize is None else self.normalize(user_input)
+        return IntentMatch(user_input, *classify(key))
+
+    def _bind(self, match):
+        """
+        Replaces the cache by an empty one filled by the given match function, unless it is already the current one.
+        Returns:
+        - callable: The cached classification of the match function
+        """
+        with self._lock:
+            classify, bound = self._bound
+            if match == bound:
+                return classify
+            self._retired = self._counters()
+            # functools.lru_cache is thread-safe and keeps its bookkeeping in C
+            classify = lru_cache(maxsize=self.maxsize)(partial(_classification, match))
+            self._classify = classify
+            self._bound = (classify, match)
+            return classify
+
+    def _counters(self):
+        """
+        Returns the hits, misses and evictions since the cache was created.
+        """
+        hits, misses, evictions = self._retired
+        if self._classify is not None:
+            info = self._classify.cache_info()
+            # Every miss adds an entry and only evictions remove one
+            hits, misses, evictions = hits + info.hits, misses + info.misses, evictions + info.misses - info.currsize
+        return hits, misses, evictions
+
+    def clear(self):
+        """
+        Drops every cached classification; the counters are kept.
+        """
+        with self._lock:
+            self._retired = self._counters()
+            self._classify = None
+            self._bound = (None, None)
+
+    def stats(self):
+        """
+        Returns the cache's counters.
+        Returns:
+        - dict: hits, misses, evictions, current size, maxsize and the hit rate
+        """
+        with self._lock:
+            hits, misses, evictions = self._counters()
+            size = self._classify.cache_info().currsize if self._classify is not None else 0
+        return {"hits": hits, "misses": misses, "evictions": evictions, "size": size, "maxsize": self.maxsize,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+
+
+def _classification(match, key):
+    """
+    Classifies an input with a match function, keeping only what ClassificationCache stores.
+    """
+    result = match(key)
+    return result.intent, result.match, result.handler, result.responses
+
+
+def parse_input(user_input, prefilter=False, rng=DEFAULT_RNG, matcher=None, cache=None, transcript=None):
+    """
+    Parses user input and determines the appropriate response based on predefined patterns.
+    Args:
+    - user_input (str): The user's input
+    - prefilter (bool or str): Only search the patterns whose keywords occur in the input; 'adaptive' checks
+      the keywords pattern by pattern, see IntentMatcher.match_adaptive
+    - rng (random.Random): The session's random source choosing the response
+    - matcher (IntentMatcher or None): The catalog to answer from, INTENT_MATCHER if None
+    - cache (ClassificationCache or None): Cache of the matcher's classifications, not cached if None
+    - transcript (TranscriptSink or None): Receives the exchange, see clinic_transcripts; not recorded if None
+    Returns:
+    - str: The response generated by the appropriate function based on the detected pattern,
+           or the default response if no pattern is matched.
+    """
+    matcher = matcher or INTENT_MATCHER
+    match = matcher.match_function(prefilter)
+    if cache is not None:
+        match = partial(cache.match, match)
+    if transcript is not None:
+        start = time.perf_counter()
+        result = _instrumentation.match(match, user_input) if _instrumentation is not None else match(user_input)
+        response = _instrumentation.respond(result, rng) if _instrumentation is not None else result.respond(rng)
+        transcript.record(user_input, result.intent, response, time.perf_counter() - start)
+        return response
+    if _instrumentation is not None:
+        return _instrumentation.respond(_instrumentation.match(match, user_input), rng)
+    return match(user_input).respond(rng)
+
+
+def classify(user_input, prefilter=False, matcher=None):
+    """
+    Determines which intent parse_input would answer an input with, without building a response:
+    no handler runs, no random choice is made and no string is formatted.
+    Args:
+    - user_input (str): The user's input
+    - prefilter (bool or str): The matching strategy, see IntentMatcher.match_function
+    - matcher (IntentMatcher or None): The catalog to classify with, INTENT_MATCHER if None
+    Returns:
+    - tuple: (IntentId, the groups captured by the intent's pattern, empty for the default case)
+    """
+    return (matcher or INTENT_MATCHER).classify(user_input, prefilter)
+
+
+def iter_parse(user_inputs, intents_only=False, prefilter=False, rng=DEFAULT_RNG, matcher=None):
+    """
+    Classifies and answers a stream of user inputs, one at a time, in input order.
+    Uses the same intent table and handlers as parse_input, looked up once for the whole stream.
+    Args:
+    - user_inputs (iterable of str): The users' inputs
+    - intents_only (bool): Yield only the intent names, without building the responses
+    - prefilter (bool or str): Only search the patterns whose keywords occur in the input; 'adaptive' checks
+      the keywords pattern by pattern, see IntentMatcher.match_adaptive
+    - rng (random.Random): The random source choosing the responses
+    - matcher (IntentMatcher or None): The catalog to answer from, INTENT_MATCHER if None
+    Yields:
+    - tuple or str: (intent, response) for every input, or only the intent if intents_only is set
+    """
+    matcher = matcher or INTENT_MATCHER
+    match = matcher.match_function(prefilter)
+    instrumentation = _instrumentation
+    if instrumentation is not None:
+        match = partial(instrumentation.match, match)
+    if intents_only:
+        for user_input in user_inputs:
+            yield match(user_input).intent
+    elif instrumentation is not None:
+        for user_input in user_inputs:
+            result = match(user_input)
+            yield result.intent, instrumentation.respond(result, rng)
+    else:
+        for user_input in user_inputs:
+            result = match(user_input)
+            yield result.intent, result.respond(rng)
+
+
+def parse_many(user_inputs, intents_only=False, prefilter=False, rng=DEFAULT_RNG, matcher=None):
+    """
+    Classifies and answers a batch of user inputs.
+    Args:
+    - user_inputs (iterable of str): The users' inputs
+    - intents_only (bool): Return only the intent names, without building the responses
+    - prefilter (bool or str): Only search the patterns whose keywords occur in the input; 'adaptive' checks
+      the keywords pattern by pattern, see IntentMatcher.match_adaptive
+    - rng (random.Random): The random source choosing the responses
+    - matcher (IntentMatcher or None): The catalog to answer from, INTENT_MATCHER if None
+    Returns:
+    - list: (intent, response) for every input, or only the intents if intents_only is set, in input order
+    """
+    return list(iter_parse(user_inputs, intents_only, prefilter, rng, matcher))
+
+
+def iter_parse_parallel(user_inputs, workers=None, chunk_size=1000, seed=0, intents_only=False, prefilter=False):
+    """
+    Classifies and answers a stream of user inputs on a pool of worker processes, in input order.
+    The inputs are sent to the workers in chunks, and only a few chunks per worker are in flight at a time,
+    so arbitrarily long streams use bounded memory. Every chunk gets its own random generator, seeded from
+    seed and the chunk's position, so the same inputs, seed and chunk_size always give the same responses.
+    Args:
+    - user_inputs (iterable of str): The users' inputs
+    - workers (int or None): Number of worker processes, defaults to the number of CPUs
+    - chunk_size (int): Number of inputs sent to a worker at once
+    - seed (int): Seed of the responses' random choices
+    - intents_only (bool): Yield only the intent names, without building the responses
+    - prefilter (bool or str): Only search the patterns whose keywords occur in the input; 'adaptive' checks
+      the keywords pattern by pattern, see IntentMatcher.match_adaptive
+    Yields:
+    - tuple or str: (intent, response) for every input, or only the intent if intents_only is set
+    """
+    workers = workers or os.cpu_count() or 1
+    user_inputs = iter(user_inputs)
+    pending = deque()
+    # Imported here: concurrent.futures.process pulls in multiprocessing, which the core does not need otherwise
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for index, chunk in enumerate(iter(lambda: list(islice(user_inputs, chunk_size)), [])):
+            pending.append(executor.submit(_parse_chunk, chunk, f"{seed}:{index}", intents_only, prefilter))
+            if len(pending) > 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def parse_parallel(user_inputs, workers=None, chunk_size=1000, seed=0, intents_only=False, prefilter=False):
+    """
+    Classifies and answers a batch of user inputs on a pool of worker processes.
+    Args:
+    - user_inputs (iterable of str): The users' inputs
+    - workers (int or None): Number of worker processes, defaults to the number of CPUs
+    - chunk_size (int): Number of inputs sent to a worker at once
+    - seed (int): Seed of the responses' random choices
+    - intents_only (bool): Return only the intent names, without building the responses
+    - prefilter (bool or str): Only search the patterns whose keywords occur in the input; 'adaptive' checks
+      the keywords pattern by pattern, see IntentMatcher.match_adaptive
+    Returns:
+    - list: (intent, response) for every input, or only the intents if intents_only is set, in input order
+    """
+    return list(iter_parse_parallel(user_inputs, workers, chunk_size, seed, intents_only, prefilter))
+
+
+def _parse_chunk(user_inputs, seed, intents_only, prefilter):
+    """
+    Runs parse_many in a worker process, with a random generator seeded for the chunk.
+    """
+    return parse_many(user_inputs, intents_only, prefilter, random.Random(seed))
+
+
+ANNOYING_WORDS = ('infuriating', 'irritating', 'frustrating', 'angry', 'annoying')
+POSITIVE_WORDS = ('amazing', 'exciting', 'joyful', 'happy', 'positive', 'uplifting')
+
+# Response sets of every intent, keyed by sub-case; built once and shared by every message.
+# Entries containing '{}' are templates, filled in with a word captured from the user's input.
+RESPONSES = {
+    "default": {
+        "default": (
+            "Could you provide more context for that statement?",
+            "I'm curious to hear more. What led you to this perspective?",
+            "Can you elaborate more?",
+        ),
+    },
+    "negation": {
+        "default": (
+            "I hear you, but have you considered the alternative?",
+            "Sometimes a 'no' is just a 'yes' waiting to be discovered. What do you think?",
+            "What if your 'not' is the key to unlocking a hidden truth?",
+        ),
+    },
+    "affirmation": {
+        "default": (
+            "That's an interesting standpoint. What led you to that conclusion?",
+            "Indeed, but what if there's an alternative perspective?",
+            "Yes, but have you considered the beauty of uncertainty?",
+            "Interesting perspective! Can you convince me more?",
+            "Is it really, or are we just agreeing to disagree?",
+            "How can you be so sure? Have you considered the opposite option?",
+        ),
+    },
+    "question": {
+        "default": (
+            "What if the answer is hidden in the question itself?",
+            "How often do you find yourself pondering such questions?",
+            "Why do you think that is?",
+            "Good question! What's your take on it?",
+            "Let's figure it out together, what do you think?",
+        ),
+    },
+    "repetitions": {
+        "yes_it_is": (
+            "No it isn't!",
+            "This feels like déjà vu. Or is it just a spirited agreement?",
+            "Yes it is, no it isn't, the dance of contradictions!",
+        ),
+        "no_it_isnt": (
+            "Yes it is!",
+            "Yes it is, no it isn't, the dance of contradictions!",
+        ),
+    },
+    "personal_statement": {
+        "default": (
+            "I appreciate your viewpoint! Let's explore it further.",
+            "Interesting, can you elaborate more?",
+            "Have you considered the opposite opinion?",
+            "Interesting perspective. Can you provide more details or examples to support your view?",
+            "Your opinion matters! What led you to form that particular viewpoint?",
+            "Personal experiences add richness to the conversation. How has this shaped your perspective?",
+            "Your viewpoint is unique. Can you share more about your personal experiences in this context?",
+        ),
+    },
+    "dismissal": {
+        "default": (
+            "What would it take to convince you, I wonder?",
+            "What if it's just a different way of thinking?",
+            "To agree or not to agree, that is the question.",
+            "Not convinced? Well, I'll put on my most convincing argument hat!",
+            "A touch of disagreement adds flavor to the conversation. Tell me more about your position",
+            "I sense skepticism in the air. Shall we agree to disagree?",
+            "Interesting. Let's explore the differences in our perspectives.",
+        ),
+    },
+    "never_always": {
+        "never": (
+            "Never? Isn't it a bit harsh to use such a final word?",
+            "Never say never, unless you're saying never say never.",
+            "Never is a strong word. Are there no circumstances where this might not hold true?",
+            "Life is full of surprises. Can we consider scenarios where 'never' might not be accurate?",
+        ),
+        "always": (
+            "Always? Isn't life full of exceptions?",
+            "Always? Isn't that a bit too definitive?",
+            "Always is a strong word. Are there no gray areas?",
+        ),
+    },
+    "too_it_will": {
+        "too": ("Too {}, or just a bit more than what you prefer?",),
+        "it_will": ("Will it {}, or is that just a possibility you're considering?",),
+    },
+    "emotions": {
+        "sad": ("I sense a touch of sadness. What's on your mind?",),
+        "confused": ("Confusion can be intriguing. Let's untangle the thoughts together.",),
+        "annoying": ("{}, or just mildly irritating in a delightful way?",),
+        "positive": ("Positive vibes! What's bringing joy to your argumentative world?",),
+        "default": ("Interesting emotions you're expressing. Care to share more?",),
+    },
+    "absolute": {
+        "impossible": (
+            "Impossible? Isn't life full of unexpected possibilities and surprises?",
+            "Impossible is just a challenge for the imagination.",
+        ),
+        "everyone_knows": ("If everyone knows it, how come we're still discussing about that?",),
+        "absolutely": ("Absolutely, or just slightly off from another angle?",),
+    },
+    "futility": {
+        "pointless": (
+            "Pointless, or just challenging in an unexpected way?",
+            "On the contrary, it's full of points. Can you see them?",
+        ),
+        "sense": (
+            "But what if it makes sense and the world is confused?",
+            "Well, sometimes making sense is overrated",
+        ),
+        "silly": (
+            "Have you considered the opposite?",
+            "Is 'silly' not a matter of perspective?",
+        ),
+    },
+    "you_are": {
+        "default": ("Am I, or is it you who is {}?",),
+    },
+    "dont_understand": {
+        "default": (
+            "Is understanding the same as agreeing?",
+            "Ah, the classic 'you don't understand.' Enlighten me, what am I missing?",
+            "I hear you. Help me understand better.",
+            "Understanding is subjective. Help me see it from your angle. What am I not getting?",
+        ),
+    },
+    "right_wrong": {
+        "right": (
+            "Have you considered the opposite opinion?",
+            "Rightness in the air! What factors contribute to this assertion of correctness?",
+            "Right, you say? Let's dive into the details of why you think so.",
+        ),
+        "wrong": (
+            "Or perhaps it's just an unconventional right?",
+            "Why do you believe it's wrong?",
+            "Convince me with your 'wrong'!",
+        ),
+    },
+    "agreement_with_doubt": {
+        "default": (
+            "Agreeing with a hint of skepticism. What aspects make you hesitant?",
+            "Interesting perspective. What reservations do you have despite the agreement?",
+        ),
+    },
+    "agreement": {
+        "default": (
+            "Glad we found common ground! What other points do you think we align on?",
+            "Acknowledging the point! How do you think this agreement influences our overall discussion?",
+            "Great to find common ground. What other aspects of our conversation resonate with you?",
+        ),
+    },
+    "preferences": {
+        "default": (
+            "Preferences play a role. What influences your preferences in this context?",
+            "Interesting preferences! How do they shape your overall stance on this matter?",
+        ),
+    },
+    "comparison": {
+        "default": (
+            "Comparisons bring depth. What factors do you see contributing to this comparison?",
+            "Interesting choice of comparison. How does it impact your overall viewpoint?",
+        ),
+    },
+    "complexity": {
+        "default": (
+            "Adding layers to the discussion. How do these complexities shape your overall viewpoint?",
+            "Complex scenarios indeed. Let's delve deeper into the intricacies of your argument.",
+        ),
+    },
+    "unexplored_areas": {
+        "default": (
+            "Unexplored territories! What prompted you to think about this aspect we haven't discussed?",
+            "Interesting point. Let's venture into the areas we haven't covered. What else comes to mind?",
+        ),
+    },
+    "future_implications": {
+        "default": (
+            "Looking ahead! How do you envision these future implications unfolding?",
+            "Future consequences are crucial. What considerations should we keep in mind?",
+        ),
+    },
+    "seeking_advice": {
+        "default": (
+            "Seeking advice? Let's explore different perspectives together. What options are you considering?",
+            "I'm here to help. What specific advice or insights are you looking for in this situation?",
+        ),
+    },
+}
+
+
+def choose_response(responses, rng=DEFAULT_RNG):
+    """
+    Picks one response from a response set, without drawing a random number when there is only one.
+    Args:
+    - responses (tuple of str): A response set from RESPONSES
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: The chosen response
+    """
+    if len(responses) == 1:
+        return responses[0]
+    return rng.choice(responses)
+
+
+# Function to handle the default case
+def handle_default_case(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles the default case when no specific pattern matches.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: A randomly chosen response from a predefined set
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_negation(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user expresses negation in their input; (Pattern: no|not).
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: A randomly chosen response from a predefined set
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_affirmation(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user expresses affirmation in their input.
+    (Pattern: yes|sure|indeed|certainly).
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: A randomly chosen response from a predefined set
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_question(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user asks a question; (Pattern: "?").
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: A randomly chosen response from a predefined set
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_repetitions(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input involves repetitions like 'yes it is' or 'no it isn't'.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a repetition pattern is detected, otherwise None
+    """
+    folded = message.folded
+    if "yes it is" in folded:
+        return choose_response(responses["yes_it_is"], rng)
+    elif "no it is not" in folded or "no it isn't" in folded:
+        return choose_response(responses["no_it_isnt"], rng)
+    return None
+
+
+def handle_personal_statement(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user makes a personal statement or expresses their viewpoint.
+    (Pattern: I think|in my idea|my opinion is|I believe|in my view|my experience with)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: A randomly chosen response from a predefined set
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_dismissal_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input indicates a dismissal or disagreement.
+    (Pattern: I don't believe|I don't agree|not convinced|disagreed|I find it hard to accept)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: A randomly chosen response from a predefined set
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_never_always(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions like 'never' or 'always'.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a 'never' or 'always' pattern is detected,
+     otherwise None
+    """
+    folded = message.folded
+    if "never" in folded:
+        return choose_response(responses["never"], rng)
+    elif "always" in folded:
+        return choose_response(responses["always"], rng)
+    return None
+
+
+def handle_too_it_will(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input indicates a situation involving 'too' or 'it will'.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent; its match holds the captured word
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A response generated based on the matched groups in the regex pattern, or None if no match is found
+    """
+    match = message.match
+    if match.group(1):
+        return choose_response(responses["too"], rng).format(match.group(1))
+    elif match.group(2):
+        return choose_response(responses["it_will"], rng).format(match.group(2))
+    return None
+
+
+def handle_emotions(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input involves expressions related to emotions.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str: A response based on detected emotional keywords in the user's input
+    """
+    folded = message.folded
+    if "sad" in folded:
+        return choose_response(responses["sad"], rng)
+    elif "confused" in folded:
+        return choose_response(responses["confused"], rng)
+    elif any(annoy in folded for annoy in ANNOYING_WORDS):
+        keyword_retort = message.text.split(None, 1)[0]
+        return choose_response(responses["annoying"], rng).format(keyword_retort)
+    elif any(positive in folded for positive in POSITIVE_WORDS):
+        return choose_response(responses["positive"], rng)
+    else:
+        return choose_response(responses["default"], rng)
+
+
+def handle_absolute_keyword(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes absolute expressions like:
+    'impossible'|'everyone knows'|'absolutely'.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if an absolute keyword pattern is detected,
+     otherwise None
+    """
+    folded = message.folded
+    if "impossible" in folded:
+        return choose_response(responses["impossible"], rng)
+    elif "everyone knows" in folded:
+        return choose_response(responses["everyone_knows"], rng)
+    elif "absolutely" in folded:
+        return choose_response(responses["absolutely"], rng)
+    return None
+
+
+def handle_futility(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions related to futility,
+    such as 'pointless'|'silly'|'sense'(=refers to 'make no sense').
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a futility keyword pattern is detected,
+     otherwise None
+    """
+    folded = message.folded
+    if "pointless" in folded:
+        return choose_response(responses["pointless"], rng)
+    elif "sense" in folded:
+        return choose_response(responses["sense"], rng)
+    elif "silly" in folded:
+        return choose_response(responses["silly"], rng)
+    return None
+
+
+def handle_you_are_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes patterns like 'you are'|'you're'|'you are not'|'you're not'.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent; its match comes from 'you_are_pattern'
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A response generated based on the detected pattern, otherwise None
+    """
+    match = message.match
+    for group in range(1, 5):
+        if match.group(group):
+            return choose_response(responses["default"], rng).format(match.group(group))
+    return None
+
+
+def handle_dont_understand(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input indicates a lack of understanding.
+    (Pattern: don't you understand|you don't understand)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a 'don't understand' pattern is detected,
+    otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_right_wrong(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions related to 'right' or 'wrong'.
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a 'right' or 'wrong' pattern is detected,
+    otherwise None
+    """
+    folded = message.folded
+    if "right" in folded:
+        return choose_response(responses["right"], rng)
+    elif "wrong" in folded:
+        return choose_response(responses["wrong"], rng)
+    return None
+
+
+def handle_agreement_doubt_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions of agreement with doubt.
+    (Pattern: agree, but|agree, although)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if an agreement with doubt pattern is detected,
+    otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_agreement_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input indicates agreement.
+    (Pattern: i agree|i see|agreed)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if an agreement pattern is detected, otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_preferences_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions related to personal preferences.
+    (Pattern: i prefer|i like|i dislike)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a preferences pattern is detected, otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_comparison_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions related to comparisons.
+    (Pattern: better than|worse than|similar to)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a comparison pattern is detected, otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_complexity_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions related to the complexity of the discussion.
+    (Pattern: but what if|considering the complexities)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a complexity pattern is detected, otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_unexplored_areas_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions related to unexplored areas in the discussion.
+    (Pattern: i haven't considered|what about)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if an unexplored areas pattern is detected,
+    otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_future_implications_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input includes expressions related to future implications.
+    (Pattern: in the future|will lead to|consequences will be)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a future implications pattern is detected,
+    otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+def handle_seeking_advice_pattern(message, responses, rng=DEFAULT_RNG):
+    """
+    Handles responses when the user's input indicates seeking advice.
+    (Pattern: what should I do|any suggestions|what do you think)
+    Args:
+    - message (IntentMatch): The user's input and its detected intent
+    - responses (dict): The intent's response sets from RESPONSES, keyed by sub-case
+    - rng (random.Random): The random source choosing the response
+    Returns:
+    - str or None: A randomly chosen response from a predefined set if a seeking advice pattern is detected,
+    otherwise None
+    """
+    return choose_response(responses["default"], rng)
+
+
+# Regular expressions for different input patterns, in the order they are checked.
+# Searching any of them takes time linear in the input: each repetition follows a literal and only runs over the
+# characters right after it, so no position is scanned more than a few times. A pattern starting with an
+# unanchored .* would restart it from every position, which is quadratic on long inputs without a match.
+negation_pattern = re.compile(r"\b(no|not)\b", re.IGNORECASE)
+affirmation_pattern = re.compile(r"\b(?:yes|sure|indeed|certainly)\b", re.IGNORECASE)
+# Ends with a question mark, before an optional final newline; finds the same messages as the former .*\?$
+question_pattern = re.compile(r"\?$")
+repetitions_pattern = re.compile(r"(\b(yes it is)|(no it is not)|(no it isn't)\b)", re.IGNORECASE)
+personal_statement_pattern = re.compile(
+    r"\b(i think\b|\bin my idea\b|\bmy opinion is\b|\bi believe\b|\bin my view\b|\bmy experience with\b)",
+    re.IGNORECASE)
+dismissal_pattern = re.compile(
+    r"\b(i don('*)t believe\b|\bi don('*)t agree\b|\not convinced\b|\bdisagreed\b|\bi find it hard to accept\b)\b",
+    re.IGNORECASE)
+never_always_pattern = re.compile(r"\b(never|always)\b", re.IGNORECASE)
+too_it_will_pattern = re.compile(r"too\s+([A-Za-z]+)|it will\s+([A-Za-z]+)", re.IGNORECASE)
+emotions_pattern = re.compile(
+    r"\b(i feel|feeling|annoying|infuriating|irritating|frustrating|amazing|exciting|"
+    r"joyful|happy|positive|uplifting|sad|angry|confused)\b", re.IGNORECASE)
+absolute_keyword = re.compile(r"\b(impossible|absolutely|everyone knows)\b", re.IGNORECASE)
+futility_keyword = re.compile(r"\b(pointless|silly|sense)\b", re.IGNORECASE)
+you_are_pattern = re.compile(
+    r"you are\s+([A-Za-z]+)|you(\'*)re\s+([A-Za-z]+)|you are not\s+([A-Za-z]+)|you(\'*)re not\s+([A-Za-z]+)",
+    re.IGNORECASE)
+dont_understand_pattern = re.compile(r"\b(don('*)t you understand(\?*))|(you don('*)t understand)\b", re.IGNORECASE)
+right_wrong_pattern = re.compile(r"\b(right|wrong)\b", re.IGNORECASE)
+agreement_with_doubt_pattern = re.compile(r"\b(agree, but|agree, although)\b", re.IGNORECASE)
+agreement_pattern = re.compile(r"\b(i agree\b|\bi see\b|\bagreed\b)", re.IGNORECASE)
+preferences_pattern = re.compile(r"\b(i prefer\b|\bi like\b|\bi dislike\b)\b", re.IGNORECASE)
+comparison_pattern = re.compile(r"\b(better than\b|\bworse than\b|\bsimilar to\b)\b", re.IGNORECASE)
+complexity_pattern = re.compile(r"\b(but what if\b|\bconsidering the complexities\b)", re.IGNORECASE)
+unexplored_areas_pattern = re.compile(r"\b(i haven('*)t considered\b|\bwhat about\b)", re.IGNORECASE)
+future_implications_pattern = re.compile(r"\b(in the future\b|\bwill lead to\b|\bconsequences will be\b)\b",
+                                         re.IGNORECASE)
+seeking_advice_pattern = re.compile(r"\b(what should i do\b|\bany suggestions\b|\bwhat do you think\b)\b",
+                                    re.IGNORECASE)
+
+# The intent table: the first matching pattern decides which function builds the response
+INTENTS = [
+    Intent("repetitions", repetitions_pattern, handle_repetitions, ("it is",)),
+    Intent("you_are", you_are_pattern, handle_you_are_pattern, ("you",)),
+    Intent("negation", negation_pattern, handle_negation, ("no",)),
+    Intent("affirmation", affirmation_pattern, handle_affirmation, ("yes", "sure", "indeed", "certainly")),
+    Intent("question", question_pattern, handle_question, ("?",)),
+    Intent("personal_statement", personal_statement_pattern, handle_personal_statement,
+           ("i think", "in my idea", "my opinion is", "i believe", "in my view", "my experience with")),
+    Intent("dismissal", dismissal_pattern, handle_dismissal_pattern,
+           ("i don", "convinced", "disagreed", "i find it hard to accept")),
+    Intent("never_always", never_always_pattern, handle_never_always, ("never", "always")),
+    Intent("too_it_will", too_it_will_pattern, handle_too_it_will, ("too", "it will")),
+    Intent("emotions", emotions_pattern, handle_emotions,
+           ("i feel", "feeling", "annoying", "infuriating", "irritating", "frustrating", "amazing", "exciting",
+            "joyful", "happy", "positive", "uplifting", "sad", "angry", "confused")),
+    Intent("absolute", absolute_keyword, handle_absolute_keyword,
+           ("impossible", "absolutely", "everyone knows")),
+    Intent("futility", futility_keyword, handle_futility, ("pointless", "silly", "sense")),
+    Intent("dont_understand", dont_understand_pattern, handle_dont_understand, ("understand",)),
+    Intent("right_wrong", right_wrong_pattern, handle_right_wrong, ("right", "wrong")),
+    Intent("agreement_with_doubt", agreement_with_doubt_pattern, handle_agreement_doubt_pattern,
+           ("agree, but", "agree, although")),
+    Intent("agreement", agreement_pattern, handle_agreement_pattern, ("i agree", "i see", "agreed")),
+    Intent("preferences", preferences_pattern, handle_preferences_pattern,
+           ("i prefer", "i like", "i dislike")),
+    Intent("comparison", comparison_pattern, handle_comparison_pattern,
+           ("better than", "worse than", "similar to")),
+    Intent("complexity", complexity_pattern, handle_complexity_pattern,
+           ("but what if", "considering the complexities")),
+    Intent("unexplored_areas", unexplored_areas_pattern, handle_unexplored_areas_pattern,
+           ("i haven", "what about")),
+    Intent("future_implications", future_implications_pattern, handle_future_implications_pattern,
+           ("in the future", "will lead to", "consequences will be")),
+    Intent("seeking_advice", seeking_advice_pattern, handle_seeking_advice_pattern,
+           ("what should i do", "any suggestions", "what do you think")),
+]
+
+# Built once at import time and shared by every call to parse_input
+INTENT_MATCHER = IntentMatcher(INTENTS, handle_default_case, RESPONSES)
+
+# Handlers a catalog file can refer to by name
+HANDLERS = {handler.__name__: handler for handler in [handle_default_case] + [intent.handler for intent in INTENTS]}
+_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+# What the handlers need from a catalog entry: the sub-cases they answer from, which are those of their built-in
+# intent, the groups of the pattern they read, and the sub-cases whose responses they format with one argument
+_HANDLER_CASES = {handle_default_case.__name__: frozenset(["default"]),
+                  **{intent.handler.__name__: frozenset(RESPONSES[intent.name]) for intent in INTENTS}}
+_HANDLER_GROUPS = {handle_too_it_will.__name__: 2, handle_you_are_pattern.__name__: 4}
+_HANDLER_FORMATTED = {handle_too_it_will.__name__: ("too", "it_will"), handle_emotions.__name__: ("annoying",),
+                      handle_you_are_pattern.__name__: ("default",)}
+
+
+def build_matcher(catalog):
+    """
+    Compiles a catalog, in the format of a JSON catalog file, into an IntentMatcher.
+    The catalog looks like {"intents": [...], "default": {"default": [...]}}. Intents are listed highest priority
+    first, each with a 'name', a 'pattern' and its 'responses' keyed by sub-case, and optionally the pattern's
+    'flags' (e.g. "i"), its 'keywords' and the name of its 'handler'. Intents without a handler answer with a
+    random response of their 'default' sub-case, like handle_default_case does.
+    The whole catalog is checked here, so that a catalog that compiles cannot fail while answering a message.
+    Args:
+    - catalog (dict): The decoded catalog
+    Returns:
+    - IntentMatcher: The compiled catalog
+    Raises:
+    - ValueError: If the catalog has a missing or mistyped field, repeats an intent name, refers to an unknown flag
+      or handler, has a pattern that does not compile or lacks the groups of its handler, or lacks a sub-case its
+      handler answers from
+    """
+    if not isinstance(catalog, dict) or not isinstance(catalog.get("intents"), list):
+        raise ValueError("The catalog is an object with a list of 'intents'")
+    intents = []
+    responses = {"default": _response_sets(catalog.get("default"), "default", handle_default_case.__name__)}
+    for entry in catalog["intents"]:
+        if not isinstance(entry, dict) or not isinstance(entry.get("name"), str):
+            raise ValueError("Every intent of the catalog is an object with a string 'name'")
+        name = entry["name"]
+        if name in responses:
+            raise ValueError(f"Intent '{name}' appears more than once in the catalog")
+        pattern, letters = entry.get("pattern"), entry.get("flags", "")
+        if not isinstance(pattern, str) or not isinstance(letters, str):
+            raise ValueError(f"Intent '{name}' needs a string 'pattern', and its 'flags' are a string")
+        flags = 0
+        for letter in letters:
+            if letter not in _FLAGS:
+                raise ValueError(f"Unknown flag '{letter}' in intent '{name}'")
+            flags |= _FLAGS[letter]
+        handler_name = entry.get("handler", "handle_default_case")
+        if not isinstance(handler_name, str) or handler_name not in HANDLERS:
+            raise ValueError(f"Unknown handler {handler_name!r} in intent '{name}'")
+        keywords = entry.get("keywords")
+        if keywords is None:
+            keywords = []  # Optional: the intent is then tried on every input
+        if not isinstance(keywords, list) or not all(isinstance(keyword, str) for keyword in keywords):
+            raise ValueError(f"The 'keywords' of intent '{name}' are a list of strings")
+        try:
+            compiled = compile_pattern(pattern, flags)
+        except re.error as error:
+            raise ValueError(f"The pattern of intent '{name}' does not compile: {error}") from error
+        if compiled.groups < _HANDLER_GROUPS.get(handler_name, 0):
+            raise ValueError(f"The pattern of intent '{name}' needs {_HANDLER_GROUPS[handler_name]} groups for "
+                             f"{handler_name}")
+        keywords = tuple(fold(keyword) for keyword in keywords)
+        intents.append(Intent(name, compiled, HANDLERS[handler_name], keywords or None))
+        responses[name] = _response_sets(entry.get("responses"), name, handler_name)
+    return IntentMatcher(intents, handle_default_case, responses)
+
+
+def _response_sets(sets, name, handler_name):
+    """
+    Checks the response lists of a catalog entry against what its handler needs, and turns them into the tuples
+    the handlers choose from.
+    """
+    if not isinstance(sets, dict) or not all(
+            isinstance(texts, list) and texts and all(isinstance(text, str) for text in texts)
+            for texts in sets.values()):
+        raise ValueError(f"The responses of '{name}' are an object of non-empty lists of strings")
+    missing = _HANDLER_CASES[handler_name] - sets.keys()
+    if missing:
+        raise ValueError(f"The responses of '{name}' lack the sub-cases {', '.join(sorted(missing))} of "
+                         f"{handler_name}")
+    for case in _HANDLER_FORMATTED.get(handler_name, ()):
+        for text in sets[case]:
+            try:
+                text.format("")
+            except (IndexError, KeyError, ValueError) as error:
+                raise ValueError(f"The response {text!r} of '{name}' cannot be formatted by {handler_name}: "
+                                 f"{error!r}") from error
+    return {case: tuple(texts) for case, texts in sets.items()}
+
+
+def catalog_to_dict(matcher=INTENT_MATCHER):
+    """
+    Describes an IntentMatcher in the catalog file format, e.g. to write the built-in catalog out for editing.
+    Args:
+    - matcher (IntentMatcher): The catalog to describe
+    Returns:
+    - dict: The catalog, ready for json.dump
+    """
+    return {
+        "intents": [{
+            "name": intent.name,
+            "pattern": intent.pattern.pattern,
+            "flags": "".join(letter for letter, flag in _FLAGS.items() if intent.pattern.flags & flag),
+            "keywords": list(intent.keywords or ()),
+            "handler": intent.handler.__name__,
+            "responses": {case: list(responses) for case, responses in matcher.responses[intent.name].items()},
+        } for intent in matcher.intents],
+        "default": {case: list(responses) for case, responses in matcher.responses["default"].items()},
+    }
+
+
+def load_catalog(path):
+    """
+    Reads and compiles a JSON catalog file.
+    Args:
+    - path (str): Path of the catalog file
+    Returns:
+    - IntentMatcher: The compiled catalog
+    """
+    import json
+
+    with open(path, encoding="utf-8") as catalog_file:
+        return build_matcher(json.load(catalog_file))
+
+
+class CatalogFile:
+    """
+    Keeps the compiled catalog of a JSON file and recompiles it when the file changes.
+    The file's modification time and size are checked at most once per check_interval seconds, and the file is
+    only recompiled if its content hash changed too. The new IntentMatcher replaces the old one in a single
+    assignment, so a message that already got the old catalog finishes with it. If the changed file cannot be
+    compiled, the previous catalog stays in use and a warning is issued.
+    By default, get() checks the file itself, so the caller that finds it changed recompiles it. With background,
+    a daemon thread checks it every check_interval instead and get() only returns the last compiled catalog, for
+    callers that must not block, such as an event loop: a large catalog takes a fraction of a second to compile.
+    """
+
+    def __init__(self, path, check_interval=1.0, background=False):
+        """
+        Args:
+        - path (str): Path of the catalog file
+        - check_interval (float): Minimum number of seconds between two checks of the file
+        - background (bool): Check and recompile the file in a background thread rather than in get()
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.background = background
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._stat = None
+        self._digest = None
+        self._matcher = None
+        self._refresh(time.monotonic())
+        self._stopped = threading.Event()
+        if background:
+            threading.Thread(target=self._watch, name="CatalogFile", daemon=True).start()
+
+    def get(self):
+        """
+        Returns the current catalog, reloading it first if the file changed, unless it is checked in the background.
+        Returns:
+        - IntentMatcher: The compiled catalog
+        """
+        if not self.background:
+            now = time.monotonic()
+            if now - self._checked_at >= self.check_interval:
+                self._refresh(now)
+        return self._matcher
+
+    def close(self):
+        """
+        Stops the background checks, if any.
+        """
+        self._stopped.set()
+
+    def _watch(self):
+        """
+        The background thread: checks the file every check_interval until closed.
+        """
+        while not self._stopped.wait(self.check_interval):
+            self._refresh(time.monotonic())
+
+    def _refresh(self, now):
+        """
+        Recompiles the catalog if the file changed since the last check.
+        """
+        import hashlib
+        import json
+
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return  # Another thread has just checked
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                if (stat.st_mtime_ns, stat.st_size) == self._stat:
+                    return
+                with open(self.path, "rb") as catalog_file:
+                    content = catalog_file.read()
+                digest = hashlib.sha256(content).digest()
+                if digest != self._digest:
+                    matcher = build_matcher(json.loads(content))
+                    if self.background:
+                        # Compiles the keyword scanner in this thread rather than on the first message
+                        matcher.match_prefiltered("")
+                    self._matcher = matcher
+                    self._digest = digest
+                self._stat = (stat.st_mtime_ns, stat.st_size)
+            except (OSError, ValueError, KeyError, re.error) as error:
+                if self._matcher is None:
+                    raise
+                warnings.warn(f"Keeping the previous catalog, {self.path} could not be loaded: {error}")
+
+
+_MASK64 = (1 << 64) - 1
+# Version, history length, turns, deadline (NaN for none), random state; followed by the history
+_SESSION_HEADER = struct.Struct("<BBIdQ")
+
+
+class Session:
+    """
+    The state of one argument: its deadline, the number of turns and a ring buffer of the last turns, each stored
+    as two small ints, the intent's IntentId and the index of the response in its response set. A few hundred
+    bytes per session, so a process can hold 100k idle sessions.
+    The session is also the random source of its handlers: its choice() avoids the responses it gave to the same
+    intent during the turns in the history. Its generator is a 64-bit splitmix64 state instead of a random.Random,
+    whose 2.5 KB state would dominate the size of a session.
+    """
+    __slots__ = ("deadline", "turns", "_history", "_state")
+
+    def __init__(self, deadline=None, history=8, seed=None):
+        """
+        Args:
+        - deadline (float or None): time.time() at which the argument ends, None for no limit
+        - history (int): Number of turns remembered, from 1 to 255
+        - seed (int or None): Seed of the random choices, a random one if None
+        Raises:
+        - ValueError: If history is out of range
+        """
+        if not 1 <= history <= 255:
+            raise ValueError(f"A session remembers 1 to 255 turns, not {history}")
+        self.deadline = deadline
+        self.turns = 0
+        # Intent id and response index of every remembered turn, one after the other
+        self._history = array("H", bytes(4 * history))
+        self._state = (int.from_bytes(os.urandom(8), "little") if seed is None else seed) & _MASK64
+
+    def expired(self, now=None):
+        """
+        Tells whether the argument's time is up.
+        Args:
+        - now (float or None): The current time.time(), read if None
+        Returns:
+        - bool: True once the deadline has passed
+        """
+        return self.deadline is not None and (time.time() if now is None else now) >= self.deadline
+
+    def respond(self, user_input, matcher=None, prefilter=True, cache=None, transcript=None):
+        """
+        Answers a message and records the turn.
+        Args:
+        - user_input (str): The user's input
+        - matcher (IntentMatcher or None): The catalog to answer from, INTENT_MATCHER if None
+        - prefilter (bool or str): The matching strategy, see IntentMatcher.match_function
+        - cache (ClassificationCache or None): Cache of the matcher's classifications, not cached if None
+        - transcript (TranscriptSink or None): Receives the exchange, see clinic_transcripts; not recorded if None
+        Returns:
+        - str: The response
+        """
+        start = time.perf_counter()
+        matcher = matcher or INTENT_MATCHER
+        match = matcher.match_function(prefilter)
+        if cache is not None:
+            match = partial(cache.match, match)
+        result = _instrumentation.match(match, user_input) if _instrumentation is not None else match(user_input)
+        slot = self.turns % (len(self._history) // 2) * 2
+        self._history[slot] = matcher.intent_id(result.intent)
+        self._history[slot + 1] = 0  # Handlers with a single response never call choice()
+        response = _instrumentation.respond(result, self) if _instrumentation is not None else result.respond(self)
+        self.turns += 1
+        if transcript is not None:
+            transcript.record(user_input, result.intent, response, time.perf_counter() - start)
+        return response
+
+    def choice(self, responses):
+        """
+        Picks a response for the turn being answered, avoiding the indices of the responses given to the same intent
+        during the remembered turns, unless all of them were. Called by the handlers through choose_response.
+        Args:
+        - responses (tuple of str): A response set
+        Returns:
+        - str: The chosen response
+        """
+        history = self._history
+        slot = self.turns % (len(history) // 2) * 2
+        intent_id = history[slot]
+        remembered = min(self.turns, len(history) // 2) * 2
+        used = {history[other + 1] for other in range(0, remembered, 2)
+                if other != slot and history[other] == intent_id}
+        candidates = [index for index in range(len(responses)) if index not in used] or range(len(responses))
+        index = candidates[self._next() % len(candidates)]
+        history[slot + 1] = index
+        return responses[index]
+
+    def _next(self):
+        """
+        Advances the splitmix64 generator.
+        Returns:
+        - int: 64 random bits
+        """
+        self._state = state = (self._state + 0x9E3779B97F4A7C15) & _MASK64
+        state = (state ^ state >> 30) * 0xBF58476D1CE4E5B9 & _MASK64
+        state = (state ^ state >> 27) * 0x94D049BB133111EB & _MASK64
+        return state ^ state >> 31
+
+    def recent(self):
+        """
+        Returns the remembered turns, oldest first.
+        Returns:
+        - list of tuple: (intent id, response index) of every remembered turn
+        """
+        history = self._history
+        size = len(history) // 2
+        return [(history[turn % size * 2], history[turn % size * 2 + 1])
+                for turn in range(self.turns - min(self.turns, size), self.turns)]
+
+    def to_bytes(self):
+        """
+        Serializes the session, e.g. to keep it in a store between requests.
+        Returns:
+        - bytes: The session, restored by from_bytes
+        """
+        deadline = float("nan") if self.deadline is None else self.deadline
+        header = _SESSION_HEADER.pack(1, len(self._history) // 2, self.turns, deadline, self._state)
+        return header + self._history.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Restores a session serialized by to_bytes.
+        Args:
+        - data (bytes): The serialized session
+        Returns:
+        - Session: The restored session
+        Raises:
+        - ValueError: If data is not a serialized session
+        """
+        version, history, turns, deadline, state = _SESSION_HEADER.unpack_from(data)
+        if version != 1 or len(data) != _SESSION_HEADER.size + 4 * history:
+            raise ValueError("Not a serialized session")
+        session = cls.__new__(cls)
+        session.deadline = None if deadline != deadline else deadline  # NaN stands for no deadline
+        session.turns = turns
+        session._history = array("H", data[_SESSION_HEADER.size:])
+        session._state = state
+        return session
+
+
+class ClinicEngine:
+    """
+    The part of the clinic shared by every session: the catalog to answer from. It keeps no per-session state,
+    each session passes its own random source, so one engine serves all the sessions of a process.
+    """
+
+    def __init__(self, catalog_path=None, prefilter=True, cache_size=0, max_length=None, transcript=None,
+                 background_reload=False):
+        """
+        Args:
+        - catalog_path (str or None): JSON catalog file to answer from, reloaded when it changes;
+          the built-in INTENT_MATCHER if None
+        - prefilter (bool or str): Only search the patterns whose keywords occur in the input; 'adaptive' checks
+          the keywords pattern by pattern, see IntentMatcher.match_adaptive
+        - cache_size (int): Number of classifications cached across sessions, 0 to disable the cache
+        - max_length (int or None): Only the first max_length characters of a message are matched and answered,
+          which bounds the time a message takes whatever the catalog's patterns; None for whole messages
+        - transcript (TranscriptSink or None): Receives every exchange, see clinic_transcripts; None to record none
+        - background_reload (bool): Check and reload the catalog file in a background thread, so that answering
+          never waits for a reload, see CatalogFile
+        """
+        self.catalog_file = CatalogFile(catalog_path, background=background_reload) if catalog_path else None
+        self.prefilter = prefilter
+        self.cache = ClassificationCache(cache_size) if cache_size > 0 else None
+        self.max_length = max_length
+        self.transcript = transcript
+
+    @property
+    def matcher(self):
+        """
+        IntentMatcher: The current catalog.
+        """
+        return self.catalog_file.get() if self.catalog_file else INTENT_MATCHER
+
+    def respond(self, user_input, rng=DEFAULT_RNG):
+        """
+        Answers a message of one session.
+        Args:
+        - user_input (str): The user's input
+        - rng (random.Random): The session's random source choosing the response
+        Returns:
+        - str: The response
+        """
+        if self.max_length is not None:
+            user_input = user_input[:self.max_length]
+        return parse_input(user_input, self.prefilter, rng, self.matcher, self.cache, self.transcript)
+
+    def respond_session(self, session, user_input):
+        """
+        Answers a message of a Session, which records the turn and avoids repeating its recent responses.
+        Args:
+        - session (Session): The argument the message belongs to
+        - user_input (str): The user's input
+        Returns:
+        - str: The response
+        """
+        if self.max_length is not None:
+            user_input = user_input[:self.max_length]
+        return session.respond(user_input, self.matcher, self.prefilter, self.cache, self.transcript)
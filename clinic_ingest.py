@@ -0,0 +1,158 @@
+"""
+Re-scores JSONL dumps of user messages: memory-maps the file, extracts only the message field of every line and
+classifies the messages in chunks, producing a histogram of the intents and, optionally, the intent of every line.
+
+    python -m clinic_ingest transcripts.jsonl                          # intent histogram
+    python -m clinic_ingest transcripts.jsonl --output intents.jsonl   # and {"line": n, "intent": ...} per line
+"""
+import argparse
+import json
+import mmap
+import re
+import sys
+from collections import Counter
+from itertools import islice
+from json.encoder import encode_basestring
+
+from clinic_core import iter_parse
+
+
+def field_pattern(field):
+    """
+    Builds the pattern of a string field of a JSON object, without decoding the rest of the line. A quoted name
+    followed by a colon is a key: inside a string value, its quotes would be escaped.
+    Args:
+    - field (str): Name of the field
+    Returns:
+    - re.Pattern: A bytes pattern whose group 1 is the raw, still escaped, UTF-8 value
+    """
+    # The value is written as runs of plain characters between escapes, which the re module matches far faster
+    # than an alternation tried on every character
+    return re.compile(re.escape(json.dumps(field).encode()) + rb'\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+
+# The strings of a JSON text, skipped whole, and the brackets opening and closing its objects and arrays
+_STRUCTURE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+
+
+def _at_top_level(prefix):
+    """
+    Tells whether a key preceded by prefix, the start of its line, belongs to the line's outermost object rather
+    than to an object nested in it.
+    """
+    if prefix.count(b"{") == 1 and b"[" not in prefix:
+        return True  # Only the line's opening brace: the usual case, decided without scanning
+    depth = 0
+    for token in _STRUCTURE.findall(prefix):
+        if token in (b"{", b"["):
+            depth += 1
+        elif token in (b"}", b"]"):
+            depth -= 1
+    return depth == 1
+
+
+def iter_messages(mapped, pattern):
+    """
+    Walks the lines of a memory-mapped JSONL file and extracts one field from each, copying only its value. Only
+    a field of the line's outermost object counts: a field of the same name in a nested object is skipped.
+    Args:
+    - mapped (mmap.mmap): The mapped file
+    - pattern (re.Pattern): The pattern of field_pattern
+    Yields:
+    - tuple: (line number starting at 1, offset of the line's end, message) for every non-empty line; the
+      message is None if the line has no such string field or its value is not valid JSON
+    """
+    find, search, size = mapped.find, pattern.search, len(mapped)
+    start = 0
+    line_number = 0
+    while start < size:
+        end = find(b"\n", start)
+        if end < 0:
+            end = size
+        line_number += 1
+        found = search(mapped, start, end)
+        while found is not None and not _at_top_level(mapped[start:found.start()]):
+            found = search(mapped, found.end(), end)
+        if found is not None:
+            value = found.group(1)
+            if b"\\" not in value:
+                yield line_number, end, value.decode("utf-8", "replace")
+            else:
+                try:
+                    yield line_number, end, json.loads(b'"' + value + b'"')
+                except ValueError:
+                    yield line_number, end, None
+        elif mapped[start:end].strip():
+            yield line_number, end, None
+        start = end + 1
+
+
+def ingest(path, field="message", output=None, prefilter="adaptive", matcher=None, chunk_size=4096):
+    """
+    Classifies the messages of a JSONL file, chunk_size lines at a time. The pages of the file already processed
+    are released after every chunk, so memory stays flat whatever the size of the file.
+    Args:
+    - path (str): The JSONL file
+    - field (str): Name of the field holding the message
+    - output (text file or None): Receives {"line": n, "intent": ...} for every message, if given
+    - prefilter (bool or str): The matching strategy, see IntentMatcher.match_function
+    - matcher (IntentMatcher or None): The catalog to classify with, INTENT_MATCHER if None
+    - chunk_size (int): Number of messages classified at once
+    Returns:
+    - tuple: (Counter of the intents, number of non-empty lines without the field)
+    """
+    histogram = Counter()
+    skipped = 0
+    with open(path, "rb") as jsonl_file:
+        if not jsonl_file.seek(0, 2):
+            return histogram, skipped  # An empty file cannot be mapped
+        with mmap.mmap(jsonl_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+            lines = iter_messages(mapped, field_pattern(field))
+            released = 0
+            for chunk in iter(lambda: list(islice(lines, chunk_size)), []):
+                # The messages are copies, the pages up to here are not read again; dropping them from memory
+                # keeps the resident size flat
+                done = chunk[-1][1] // mmap.PAGESIZE * mmap.PAGESIZE
+                if done > released:
+                    mapped.madvise(mmap.MADV_DONTNEED, released, done - released)
+                    released = done
+                messages = [line for line in chunk if line[2] is not None]
+                skipped += len(chunk) - len(messages)
+                if not messages:
+                    continue
+                line_numbers, _, texts = zip(*messages)
+                intents = list(iter_parse(texts, intents_only=True, prefilter=prefilter, matcher=matcher))
+                histogram.update(intents)
+                if output is not None:
+                    output.write("".join(f'{{"line": {line_number}, "intent": {encode_basestring(intent)}}}\n'
+                                         for line_number, intent in zip(line_numbers, intents)))
+    return histogram, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Histogram of the intents of the messages in a JSONL file")
+    parser.add_argument("path", help="JSONL file, one JSON object per line")
+    parser.add_argument("--field", default="message", help="name of the field holding the message")
+    parser.add_argument("--output", metavar="PATH", help="write the intent of every line to this JSONL file")
+    parser.add_argument("--strategy", choices=("chain", "prefilter", "adaptive"), default="adaptive")
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    args = parser.parse_args(argv)
+    prefilter = {"chain": False, "prefilter": True, "adaptive": "adaptive"}[args.strategy]
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        histogram, skipped = ingest(args.path, args.field, output, prefilter, chunk_size=args.chunk_size)
+    finally:
+        if output is not None:
+            output.close()
+    total = sum(histogram.values())
+    for intent, count in histogram.most_common():
+        print(f"{intent:<22} {count:>10} {count / total:7.1%}")
+    print(f"{'messages':<22} {total:>10}")
+    if skipped:
+        print(f"{skipped} lines without a string {args.field!r} field", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Load generator for clinic_server: runs many concurrent argument sessions and reports sessions per second and
+reply latency.
+
+    python -m clinic_loadgen                              # starts a local server on a free port
+    python -m clinic_loadgen --port 8765 --sessions 5000  # against a running server
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from clinic_bench import generate_corpus, latency_stats
+
+
+async def run_client(host, port, messages, latencies):
+    """
+    Runs one session: sends the messages one at a time, waiting for every reply, then 'exit'.
+    Args:
+    - host (str): The server's host
+    - port (int): The server's port
+    - messages (list of str): The messages to send
+    - latencies (list of int): Receives the time from sending every message to its reply, in nanoseconds
+    """
+    clock = time.perf_counter_ns
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await reader.readline()  # The greeting
+        for message in messages:
+            start = clock()
+            writer.write(f"{message}\n".encode())
+            await reader.readline()
+            latencies.append(clock() - start)
+        writer.write(b"exit\n")
+        await reader.readline()  # The closing line
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def generate_load(host, port, sessions, concurrency, messages_per_session, seed=0):
+    """
+    Runs sessions against a server, at most concurrency of them at a time.
+    Args:
+    - host (str): The server's host
+    - port (int): The server's port
+    - sessions (int): Number of sessions to run
+    - concurrency (int): Number of sessions open at the same time
+    - messages_per_session (int): Number of messages sent in every session
+    - seed (int): Seed of the generated messages
+    Returns:
+    - dict: Sessions, seconds, sessions and messages per second, and the reply latency, see latency_stats
+    """
+    corpus = generate_corpus(sessions * messages_per_session, seed)
+    corpus = [message.replace("\n", " ") for message in corpus]
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def session(index):
+        async with semaphore:
+            messages = corpus[index * messages_per_session:(index + 1) * messages_per_session]
+            await run_client(host, port, messages, latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(index) for index in range(sessions)))
+    seconds = time.perf_counter() - start
+    return {
+        "sessions": sessions,
+        "seconds": seconds,
+        "sessions_per_second": sessions / seconds,
+        "messages_per_second": len(latencies) / seconds,
+        "latency": latency_stats(latencies),
+    }
+
+
+def start_server(*server_args):
+    """
+    Starts clinic_server on a free local port in a child process.
+    Args:
+    - server_args (str): Extra command line arguments of the server
+    Returns:
+    - tuple: (subprocess.Popen, host, port)
+    """
+    process = subprocess.Popen([sys.executable, "-m", "clinic_server", "--port", "0", *server_args],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("listening on "):
+        process.kill()
+        raise RuntimeError(f"clinic_server did not start: {line!r}")
+    host, port = line.split()[-1].rsplit(":", 1)
+    return process, host, int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent sessions against clinic_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="a running server; by default one is started on a free port")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10, help="messages per session")
+    args = parser.parse_args(argv)
+    process = None
+    host, port = args.host, args.port
+    if port is None:
+        process, host, port = start_server()
+    try:
+        results = asyncio.run(generate_load(host, port, args.sessions, args.concurrency, args.messages))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    latency = results["latency"]
+    print(f"{results['sessions']} sessions, {args.concurrency} at a time, in {results['seconds']:.2f}s: "
+          f"{results['sessions_per_second']:,.0f} sessions/s, {results['messages_per_second']:,.0f} messages/s")
+    print(f"reply latency: p50 {latency['p50_us']:.0f}us, p99 {latency['p99_us']:.0f}us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
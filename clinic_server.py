@@ -0,0 +1,185 @@
+"""
+A line-oriented asyncio server running argument clinic sessions outside Streamlit.
+
+    python -m clinic_server --port 8765      # TCP, one session per connection
+    python -m clinic_server --stdio          # a single session on stdin and stdout
+
+Every line a client sends is a message and is answered by one line, 'Clinic: <response>'. A session ends when the
+client sends 'exit', when its time limit runs out, or when the client disconnects; the server then sends the
+closing line and closes the connection.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from functools import partial
+
+from clinic_core import ClinicEngine
+from clinic_transcripts import TranscriptSink
+
+END_MESSAGE = "The argument clinic session is over. Thanks for participating. Have a great day!"
+
+
+class ClinicServer:
+    """
+    Runs many argument sessions concurrently on one event loop, all answered by one shared ClinicEngine.
+    The time limit of a session is a timer of the event loop, which ends the session even while the client is
+    idle, so nothing polls the clock. Answering a message takes microseconds and runs on the loop; messages
+    longer than offload_length are answered in a worker thread, so a huge paste does not stall other sessions.
+    An engine answering from a catalog file should reload it in the background (background_reload), or the
+    message that finds the file changed recompiles it on the loop.
+    """
+
+    def __init__(self, engine, minutes=5.0, offload_length=4096, max_line=1 << 20):
+        """
+        Args:
+        - engine (ClinicEngine): The engine answering every session
+        - minutes (float): Time limit of a session
+        - offload_length (int): Messages longer than this many characters are answered in a worker thread
+        - max_line (int): Longest line accepted, in bytes; a longer line ends the session
+        """
+        self.engine = engine
+        self.minutes = minutes
+        self.offload_length = offload_length
+        self.max_line = max_line
+        self.active_sessions = 0
+        self.total_sessions = 0
+
+    async def run_session(self, reader, writer):
+        """
+        Runs one argument session on a connection, until it ends, and closes the connection.
+        Args:
+        - reader (asyncio.StreamReader): The client's messages, one per line
+        - writer (asyncio.StreamWriter): Where the replies go
+        """
+        self.active_sessions += 1
+        self.total_sessions += 1
+        try:
+            writer.write(f"Argument clinic session will last for {self.minutes:g} minutes. "
+                         f"Type 'exit' to end the argument.\n".encode())
+            try:
+                async with asyncio.timeout(self.minutes * 60):
+                    await self._converse(reader, writer, random.Random())
+            except TimeoutError:
+                pass
+            except ValueError:
+                pass  # A line longer than max_line
+            writer.write(f"{END_MESSAGE}\n".encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.active_sessions -= 1
+            writer.close()
+
+    async def _converse(self, reader, writer, rng):
+        """
+        Answers the client's messages until it sends 'exit' or disconnects.
+        """
+        loop = asyncio.get_running_loop()
+        respond = self.engine.respond
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            user_input = line.decode("utf-8", "replace").rstrip("\r\n")
+            if user_input.lower().strip() == "exit":
+                return
+            if len(user_input) > self.offload_length:
+                response = await loop.run_in_executor(None, respond, user_input, rng)
+            else:
+                response = respond(user_input, rng)
+            writer.write(f"Clinic: {response}\n".encode())
+            await writer.drain()
+
+    async def serve_tcp(self, host="127.0.0.1", port=8765, backlog=1024):
+        """
+        Accepts connections and runs a session on each of them, until cancelled.
+        Prints 'listening on <host>:<port>' once the socket is bound, with the actual port if port is 0.
+        Args:
+        - host (str): Interface to listen on
+        - port (int): Port to listen on, 0 for any free port
+        - backlog (int): Number of connections waiting to be accepted
+        """
+        server = await asyncio.start_server(self.run_session, host, port, limit=self.max_line, backlog=backlog)
+        bound_host, bound_port = server.sockets[0].getsockname()[:2]
+        print(f"listening on {bound_host}:{bound_port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self):
+        """
+        Runs a single session on stdin and stdout.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=self.max_line, loop=loop)
+        try:
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader, loop=loop), sys.stdin)
+        except ValueError:
+            # The event loop can only watch pipes, sockets and terminals; a regular file is read in a thread
+            loop.run_in_executor(None, _feed_reader, loop, reader, sys.stdin.buffer)
+        try:
+            transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+            writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        except ValueError:
+            writer = _FileWriter(sys.stdout.buffer)
+        await self.run_session(reader, writer)
+
+
+def _feed_reader(loop, reader, binary_file):
+    """
+    Passes the contents of a file to a StreamReader of the event loop, from a worker thread.
+    """
+    for chunk in iter(partial(binary_file.read1, 1 << 16), b""):
+        loop.call_soon_threadsafe(reader.feed_data, chunk)
+    loop.call_soon_threadsafe(reader.feed_eof)
+
+
+class _FileWriter:
+    """
+    The part of asyncio.StreamWriter that ClinicServer uses, writing to a regular file.
+    """
+
+    def __init__(self, binary_file):
+        self.write = binary_file.write
+        self._file = binary_file
+
+    async def drain(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve argument clinic sessions over TCP or stdin/stdout")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--stdio", action="store_true", help="run a single session on stdin and stdout")
+    parser.add_argument("--minutes", type=float, default=5.0, help="time limit of a session")
+    parser.add_argument("--catalog", default=os.environ.get("CLINIC_CATALOG"), help="JSON catalog to answer from")
+    parser.add_argument("--cache-size", type=int, default=4096, help="classifications cached, 0 to disable")
+    parser.add_argument("--max-length", type=int, help="only answer the first characters of every message")
+    parser.add_argument("--transcript", metavar="PATH", help="append every exchange to this JSONL file")
+    parser.add_argument("--offload-length", type=int, default=4096,
+                        help="answer longer messages in a worker thread")
+    args = parser.parse_args(argv)
+    transcript = TranscriptSink(args.transcript) if args.transcript else None
+    # The event loop answers short messages itself, so the catalog is reloaded by a thread rather than by the
+    # message that finds it changed
+    engine = ClinicEngine(args.catalog, cache_size=args.cache_size, max_length=args.max_length, transcript=transcript,
+                          background_reload=True)
+    server = ClinicServer(engine, args.minutes, args.offload_length)
+    try:
+        asyncio.run(server.serve_stdio() if args.stdio else server.serve_tcp(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if transcript is not None:
+            transcript.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Session stores: where the clinic keeps every argument's Session (its deadline, turn count and recent turns) between
+messages, keyed by a session id, so that any worker process can answer the next message of any session.
+
+    store = SQLiteSessionStore("sessions.db")   # shared by every process on the machine
+    session = store.get(session_id) or Session(deadline=time.time() + 300)
+    response = engine.respond_session(session, user_input)
+    store.put(session_id, session)
+
+A store holds sessions for ttl seconds after their deadline, or after their last write if they have none; expired
+sessions read as missing and are deleted by periodic sweeps.
+"""
+import atexit
+import sqlite3
+import threading
+import time
+import warnings
+from abc import ABC, abstractmethod
+
+from clinic_core import Session
+
+
+class SessionStore(ABC):
+    """
+    The interface of the session stores. Sessions are stored serialized, so a Session read from a store is a copy:
+    changes are only seen by other readers once put back.
+    """
+
+    def __init__(self, ttl=3600.0):
+        """
+        Args:
+        - ttl (float): Seconds a session is kept after its deadline, or after its last write if it has none
+        """
+        self.ttl = ttl
+
+    @abstractmethod
+    def get(self, session_id):
+        """
+        Reads a session.
+        Args:
+        - session_id (str): The session's id
+        Returns:
+        - Session or None: The session, None if the store has no such session or it expired
+        """
+
+    @abstractmethod
+    def put(self, session_id, session):
+        """
+        Writes a session, replacing the one stored under the same id.
+        Args:
+        - session_id (str): The session's id
+        - session (Session): The session
+        """
+
+    @abstractmethod
+    def delete(self, session_id):
+        """
+        Removes a session, if stored.
+        Args:
+        - session_id (str): The session's id
+        """
+
+    @abstractmethod
+    def sweep(self, now=None):
+        """
+        Deletes the expired sessions.
+        Args:
+        - now (float or None): The current time.time(), read if None
+        Returns:
+        - int: Number of sessions deleted
+        """
+
+    def close(self):
+        """
+        Writes out pending writes and releases the store's resources.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _expires(self, session, now):
+        """
+        Returns the time.time() at which a session written now expires.
+        """
+        return (now if session.deadline is None else session.deadline) + self.ttl
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Keeps the sessions in a dict of this process: the fastest store, for a single worker and for tests.
+    """
+
+    def __init__(self, ttl=3600.0):
+        super().__init__(ttl)
+        self._sessions = {}  # session id -> (expires, serialized session)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None or entry[0] < time.time():
+            return None
+        return Session.from_bytes(entry[1])
+
+    def put(self, session_id, session):
+        entry = (self._expires(session, time.time()), session.to_bytes())
+        with self._lock:
+            self._sessions[session_id] = entry
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [session_id for session_id, (expires, _) in self._sessions.items() if expires < now]
+            for session_id in expired:
+                del self._sessions[session_id]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Keeps the sessions in a SQLite database file, shared by every process that opens it, without a server.
+    - One connection is opened and reused by every thread, one statement or transaction at a time, and SQLite keeps
+      its statements prepared. Threads come and go, Streamlit starts one per rerun, so none gets its own.
+    - Writes are batched: put() and delete() only update a dict of pending writes, which a background thread
+      commits in one transaction when batch_size of them are pending or every flush_interval. Reads of this
+      process see its pending writes at once; other processes see them once committed, after flush_interval at
+      most, far less than the time a user takes to type the next message.
+    - The same thread deletes the expired sessions every sweep_interval, using the index on their expiry.
+    The database runs in WAL mode, so readers never wait for the writers of other processes. Every process opens
+    its own store, after any fork: connections cannot be shared across processes.
+    """
+
+    def __init__(self, path, ttl=3600.0, batch_size=256, flush_interval=0.02, sweep_interval=60.0, timeout=10.0):
+        """
+        Args:
+        - path (str): The database file, created if missing
+        - ttl (float): Seconds a session is kept after its deadline, or after its last write if it has none
+        - batch_size (int): Number of pending writes that wakes the writer before flush_interval
+        - flush_interval (float): Longest time, in seconds, a write stays pending
+        - sweep_interval (float): Seconds between two sweeps of the expired sessions
+        - timeout (float): Seconds to wait for a lock held by another process before failing
+        """
+        super().__init__(ttl)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()  # Guards the pending writes and the writes being committed
+        self._database_lock = threading.Lock()  # Guards the connection
+        self._pending = {}  # session id -> (expires, serialized session), or None for a deletion
+        self._committing = {}  # The pending writes being committed, still visible to get()
+        # Writes take the database's lock when their transaction starts, not when it commits; used from any thread
+        # under _database_lock
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level="IMMEDIATE",
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS sessions "
+                                 "(id TEXT PRIMARY KEY, expires REAL NOT NULL, data BLOB NOT NULL) WITHOUT ROWID")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+        self._closed = False
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SQLiteSessionStore", daemon=True)
+        self._thread.start()
+        # A daemon thread dies with the interpreter, so the pending writes are committed before that
+        atexit.register(self.close)
+
+    def get(self, session_id):
+        with self._lock:
+            # A write is either pending, being committed or in the database: flush() moves it from one to the next
+            # under this lock
+            entry = self._pending.get(session_id, False)
+            if entry is False:
+                entry = self._committing.get(session_id, False)
+        if entry is False:
+            with self._database_lock:
+                entry = self._connection.execute("SELECT expires, data FROM sessions WHERE id = ?",
+                                                 (session_id,)).fetchone()
+        if entry is None or entry[0] < time.time():
+            return None
+        return Session.from_bytes(entry[1])
+
+    def put(self, session_id, session):
+        entry = (self._expires(session, time.time()), session.to_bytes())
+        with self._lock:
+            self._pending[session_id] = entry
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._pending[session_id] = None
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        with self._database_lock, self._connection as connection:
+            return connection.execute("DELETE FROM sessions WHERE expires < ?", (now,)).rowcount
+
+    def flush(self):
+        """
+        Commits the pending writes of this process now.
+        """
+        with self._database_lock:
+            with self._lock:
+                self._committing = pending = self._pending
+                self._pending = {}
+            if not pending:
+                return
+            try:
+                with self._connection as connection:  # One transaction
+                    connection.executemany("INSERT OR REPLACE INTO sessions (id, expires, data) VALUES (?, ?, ?)",
+                                           [(session_id, *entry) for session_id, entry in pending.items()
+                                            if entry is not None])
+                    connection.executemany("DELETE FROM sessions WHERE id = ?",
+                                           [(session_id,) for session_id, entry in pending.items() if entry is None])
+            except sqlite3.Error:
+                with self._lock:
+                    # Keep the writes for the next attempt, unless overwritten in the meantime
+                    self._pending = {**pending, **self._pending}
+                    self._committing = {}
+                raise
+            with self._lock:
+                self._committing = {}
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        with self._database_lock:
+            self._connection.close()
+
+    def _run(self):
+        """
+        The writer thread: commits the pending writes whenever woken or every flush_interval, and sweeps the expired
+        sessions every sweep_interval, until closed.
+        """
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.sweep_interval
+                    self.sweep()
+            except sqlite3.Error as error:
+                # Another process held the database for longer than timeout; the writes stay pending
+                warnings.warn(f"Could not write the sessions to {self.path}: {error}")
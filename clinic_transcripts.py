@@ -0,0 +1,245 @@
+"""
+Transcripts of the clinic's exchanges for audit: every message, its intent, the response, when it was answered and
+how long answering took, written as JSONL by a background thread.
+
+    sink = TranscriptSink("transcripts.jsonl")
+    engine = ClinicEngine(transcript=sink)   # every exchange the engine answers is recorded
+    ...
+    sink.close()                             # or at interpreter exit, whichever comes first
+
+Recording a message only appends it to a queue; the writer thread encodes and writes the queued messages in
+batches, so no file write ever happens on the reply path.
+"""
+import atexit
+import os
+import threading
+import time
+import warnings
+from collections import deque
+from functools import lru_cache
+from json.encoder import encode_basestring
+
+
+class TranscriptSink:
+    """
+    Queues exchanges and writes them to a JSONL file from a background thread, one JSON object per line:
+    {"timestamp": ISO 8601 UTC, "message": ..., "intent": ..., "response": ..., "latency_us": ...}.
+    The queue is written when it holds batch_size records or flush_interval seconds after the last write, whichever
+    comes first, and always when the sink is closed, which also happens at interpreter exit.
+    When max_queue records are waiting, because the disk does not keep up, the overflow policy applies:
+    - 'drop': the new record is discarded and counted in stats()["dropped"]; recording never waits, which is what
+      an event loop or a UI needs
+    - 'block': the caller waits until the writer has made room, so no record is lost but the disk's latency reaches
+      the reply path
+    """
+
+    def __init__(self, path, batch_size=1024, flush_interval=1.0, max_bytes=64 << 20, backups=5,
+                 max_queue=100_000, overflow="drop", fsync=False):
+        """
+        Args:
+        - path (str): The JSONL file, appended to
+        - batch_size (int): Number of queued records that wakes the writer before flush_interval
+        - flush_interval (float): Longest time, in seconds, a record waits in the queue
+        - max_bytes (int): The file is rotated before it grows past this size, 0 to never rotate
+        - backups (int): Number of rotated files kept, as path.1 (the newest) to path.<backups>
+        - max_queue (int): Number of records waiting to be written before the overflow policy applies
+        - overflow (str): 'drop' or 'block', see the class
+        - fsync (bool): Sync every batch to the disk, not only to the operating system
+        Raises:
+        - ValueError: If overflow is neither 'drop' nor 'block'
+        """
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"The overflow policy is 'drop' or 'block', not {overflow!r}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.fsync = fsync
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._room = threading.Condition()  # Notified after every batch, for the 'block' policy
+        self._lock = threading.Lock()
+        self._written = self._dropped = self._batches = self._rotations = 0
+        self._closed = False
+        self._busy = False  # The writer has taken records off the queue and not written them yet
+        self._running = True  # Cleared when the writer thread ends, however it ends
+        self._file = open(path, "ab")
+        self._thread = threading.Thread(target=self._run, name="TranscriptSink", daemon=True)
+        self._thread.start()
+        # A daemon thread dies with the interpreter, so the queue is written out before that
+        atexit.register(self.close)
+
+    def record(self, user_input, intent, response, seconds):
+        """
+        Queues one exchange. Cheap enough for the reply path: the record is encoded and written by the writer thread.
+        Args:
+        - user_input (str): The user's input
+        - intent (str): Name of the detected intent
+        - response (str): The response
+        - seconds (float): Time taken to answer
+        Returns:
+        - bool: False if the record was dropped, because the queue is full, the sink closed or its writer thread
+          ended
+        """
+        queue = self._queue
+        if len(queue) >= self.max_queue or not self._running or self._closed:
+            if self.overflow == "block":
+                with self._room:
+                    self._wake.set()
+                    # The writer notifies after every batch and when it ends, so a dead writer cannot hang this
+                    while len(queue) >= self.max_queue and self._running and not self._closed:
+                        self._room.wait()
+            if len(queue) >= self.max_queue or not self._running or self._closed:
+                with self._lock:
+                    self._dropped += 1
+                return False
+        queue.append((time.time(), user_input, intent, response, seconds))
+        if len(queue) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Waits until the records queued so far are written.
+        Args:
+        - timeout (float or None): Longest wait in seconds, None to wait as long as it takes
+        Returns:
+        - bool: True if the queue was written out in time, False also if the writer thread ended without being
+          closed, dropping the queue
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._room:
+            while (self._queue or self._busy) and self._running:
+                self._wake.set()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._room.wait(remaining)
+        return not (self._queue or self._busy) and (self._running or self._closed)
+
+    def close(self):
+        """
+        Writes out the queue, stops the writer thread and closes the file. Records arriving afterwards are dropped.
+        Calling it again does nothing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._wake.set()
+        self._thread.join()
+        self._file.close()
+        with self._lock:
+            self._dropped += len(self._queue)  # Queued while the writer was finishing
+        self._queue.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        """
+        Returns:
+        - dict: Records written and dropped, batches written, files rotated and records waiting in the queue
+        """
+        with self._lock:
+            return {"written": self._written, "dropped": self._dropped, "batches": self._batches,
+                    "rotations": self._rotations, "queued": len(self._queue)}
+
+    def _run(self):
+        """
+        The writer thread: writes the queue whenever woken or every flush_interval, until closed and empty. A batch
+        that fails is dropped and counted, so the thread outlives any error; if it ends anyway, the records still
+        queued are counted as dropped and record() drops the next ones.
+        """
+        queue = self._queue
+        try:
+            while True:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                closing = self._closed
+                while queue:
+                    self._busy = True
+                    batch = [queue.popleft() for _ in range(min(len(queue), self.batch_size))]
+                    try:
+                        self._write(batch)
+                    except Exception as error:
+                        with self._lock:
+                            self._dropped += len(batch)
+                        warnings.warn(f"Dropped {len(batch)} transcript records, {self.path} could not be "
+                                      f"written: {error!r}")
+                    self._busy = False
+                    with self._room:
+                        self._room.notify_all()
+                if closing:
+                    return
+        finally:
+            self._running = self._busy = False
+            with self._lock:
+                self._dropped += len(queue)
+            queue.clear()
+            with self._room:
+                self._room.notify_all()
+
+    def _write(self, batch):
+        """
+        Encodes a batch and appends it to the file, rotating the file first if it would grow past max_bytes.
+        """
+        data = "".join(
+            f'{{"timestamp": "{_utc_second(int(timestamp))}.{int(timestamp % 1 * 1e6):06d}Z", '
+            f'"message": {encode_basestring(user_input)}, "intent": {encode_basestring(intent)}, '
+            f'"response": {encode_basestring(response)}, "latency_us": {seconds * 1e6:.1f}}}\n'
+            for timestamp, user_input, intent, response, seconds in batch).encode("utf-8")
+        try:
+            if self._file.closed:
+                self._file = open(self.path, "ab")  # A rotation failed to reopen it
+            if self.max_bytes and self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+                try:
+                    self._rotate()
+                except OSError as error:
+                    warnings.warn(f"Could not rotate {self.path}, appending to it: {error}")
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except OSError as error:
+            with self._lock:
+                self._dropped += len(batch)
+            warnings.warn(f"Dropped {len(batch)} transcript records, {self.path} could not be written: {error}")
+            return
+        with self._lock:
+            self._written += len(batch)
+            self._batches += 1
+
+    def _rotate(self):
+        """
+        Renames path to path.1, path.1 to path.2 and so on, dropping the oldest, and starts a new file. If renaming
+        fails, path is opened again and appended to.
+        """
+        self._file.close()
+        mode = "ab"
+        try:
+            if self.backups > 0:
+                for index in range(self.backups - 1, 0, -1):
+                    if os.path.exists(f"{self.path}.{index}"):
+                        os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                mode = "wb"  # No backups kept: start over
+        finally:
+            self._file = open(self.path, mode)
+        with self._lock:
+            self._rotations += 1
+
+
+@lru_cache(maxsize=4)
+def _utc_second(second):
+    """
+    Formats a whole second of a timestamp, the records of a batch mostly share a few of them.
+    """
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
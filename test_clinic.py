@@ -0,0 +1,53 @@
+"""
+The consistency checks of clinic_bench, on corpora small enough for every test run: python -m pytest
+"""
+import pytest
+
+from clinic_bench import (check_classify, check_fuzz, check_handlers, check_prefiltered, generate_corpus,
+                          generate_fuzz_corpus)
+from clinic_core import (INTENT_MATCHER, Instrumentation, build_matcher, catalog_to_dict, disable_instrumentation,
+                         enable_instrumentation, parse_input)
+
+CORPUS = generate_corpus(3000, seed=0)
+
+
+@pytest.mark.parametrize("prefilter", [True, "adaptive"])
+def test_strategies_match_the_chain(prefilter):
+    assert check_prefiltered(CORPUS, INTENT_MATCHER, prefilter) == []
+
+
+def test_classify_agrees_with_parse_input():
+    assert check_classify(CORPUS) == []
+
+
+def test_fuzzed_messages_agree():
+    assert check_fuzz(generate_fuzz_corpus(2000, 60)) == []
+
+
+def test_every_message_is_answered():
+    assert check_handlers(CORPUS[:1000]) == []
+
+
+@pytest.mark.parametrize("keywords", [{}, {"keywords": []}, {"keywords": None}])
+def test_catalog_without_keywords_loads(keywords):
+    catalog = {"intents": [{"name": "x", "pattern": "foo", "responses": {"default": ["a"]}, **keywords}],
+               "default": {"default": ["d"]}}
+    assert build_matcher(catalog).match("foo").intent == "x"
+
+
+def test_builtin_catalog_round_trips():
+    matcher = build_matcher(catalog_to_dict())
+    assert check_prefiltered(CORPUS, matcher, False) == check_prefiltered(CORPUS, matcher, True) == []
+    assert [matcher.match(message).intent for message in CORPUS] == [
+        INTENT_MATCHER.match(message).intent for message in CORPUS]
+
+
+def test_prometheus_escapes_intent_names():
+    catalog = {"intents": [{"name": 'say "hi"\\\n', "pattern": "hi", "responses": {"default": ["a"]}}],
+               "default": {"default": ["d"]}}
+    instrumentation = enable_instrumentation(Instrumentation())
+    try:
+        parse_input("hi", matcher=build_matcher(catalog))
+    finally:
+        disable_instrumentation()
+    assert 'clinic_messages_total{intent="say \\"hi\\"\\\\\\n"} 1' in instrumentation.to_prometheus().splitlines()